@@ -29,6 +29,12 @@ except KeyError:
 
 consumer_key_encoded = CONSUMER_KEY.encode()
 
+# Key the HMAC once, every signature starts from a copy of this state
+keyed_hmac = hmac.new(consumer_key_encoded, digestmod=sha256)
+
+# json.dumps builds a new encoder on every call when given options, reuse one instead
+sig_encoder = json.JSONEncoder(separators=(",", ":"), sort_keys=True)
+
 base_api = "https://api.snaptrade.com/api/v1"
 
 
@@ -60,8 +66,10 @@ def sign_request(req):
 
     sig_object = {"content": req.data if req.data != [] else None, "path": request_path, "query": request_query}
 
-    sig_content = json.dumps(sig_object, separators=(",", ":"), sort_keys=True)
-    sig_digest = hmac.new(consumer_key_encoded, sig_content.encode(), sha256).digest()
+    sig_content = sig_encoder.encode(sig_object)
+    sig_hmac = keyed_hmac.copy()
+    sig_hmac.update(sig_content.encode())
+    sig_digest = sig_hmac.digest()
 
     signature = b64encode(sig_digest).decode()
 
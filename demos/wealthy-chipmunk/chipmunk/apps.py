@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class ChipmunkConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "chipmunk"
+
+    def ready(self):
+        from chipmunk.db import apply_sqlite_pragmas
+
+        connection_created.connect(apply_sqlite_pragmas, dispatch_uid="chipmunk.db.apply_sqlite_pragmas")
@@ -0,0 +1,42 @@
+from asgiref.sync import sync_to_async
+from chipmunk.streaming import BlockingStreamingHttpResponse
+from chipmunk.transport import mark_long_lived_loop
+from django.core.handlers.asgi import ASGIHandler
+
+
+class ChipmunkASGIHandler(ASGIHandler):
+    """
+    Django's ASGI handler, running on the long-lived loops of an ASGI server.
+    Django 3.2 iterates a streaming response on the event loop itself, a
+    BlockingStreamingHttpResponse is iterated off it instead.
+    """
+
+    async def __call__(self, scope, receive, send):
+        mark_long_lived_loop()
+
+        await super().__call__(scope, receive, send)
+
+    async def send_response(self, response, send):
+        if not isinstance(response, BlockingStreamingHttpResponse):
+            return await super().send_response(response, send)
+
+        # As ASGIHandler.send_response, with async for in place of for
+        response_headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode("ascii")
+            if isinstance(value, str):
+                value = value.encode("latin1")
+            response_headers.append((bytes(header), bytes(value)))
+        for cookie in response.cookies.values():
+            response_headers.append((b"Set-Cookie", cookie.output(header="").encode("ascii").strip()))
+
+        await send({"type": "http.response.start", "status": response.status_code, "headers": response_headers})
+
+        async for part in response:
+            for chunk, _ in self.chunk_bytes(part):
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+
+        await send({"type": "http.response.body"})
+
+        await sync_to_async(response.close, thread_sensitive=True)()
@@ -0,0 +1,157 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+HOLDINGS_KEY = "chipmunk:holdings:%s:%s:%s"
+GENERATION_KEY = "chipmunk:holdings-generation:%s"
+REFRESH_KEY = "chipmunk:holdings-refresh:%s:%s"
+RATES_KEY = "chipmunk:fx-rates"
+LOGIN_REDIRECT_KEY = "chipmunk:login-redirect:%s"
+LOGIN_REDIRECT_PREFETCH_KEY = "chipmunk:login-redirect-prefetch:%s"
+USER_SECRET_KEY = "chipmunk:user-secret:%s"
+
+# Entries live in the SNAPTRADE_HOLDINGS_CACHE cache. It is shared between workers only when that cache is, as with
+# Prod's Memcached or database cache. Dev's default LocMemCache keeps a separate copy in every process.
+
+# Process-local user secret tokens, {user id: (expires at, token)}, emptied when it outgrows LOCAL_USER_SECRETS_MAX
+_local_user_secrets = {}
+LOCAL_USER_SECRETS_MAX = 10000
+
+
+def _cache():
+    return caches[getattr(settings, "SNAPTRADE_HOLDINGS_CACHE", "default")]
+
+
+def _ttl():
+    return getattr(settings, "SNAPTRADE_HOLDINGS_CACHE_TTL", 60)
+
+
+def _stale_ttl():
+    return getattr(settings, "SNAPTRADE_HOLDINGS_CACHE_STALE_TTL", 0)
+
+
+def _accounts_key(accounts):
+    return ",".join(sorted(accounts)) if accounts else "*"
+
+
+def _holdings_key(cache, user, accounts):
+    # Every entry of a user embeds the user's generation, bumping it drops them all at once
+    generation = cache.get_or_set(GENERATION_KEY % user.pk, time.time_ns, None)
+
+    return HOLDINGS_KEY % (user.pk, generation, _accounts_key(accounts))
+
+
+def get_cached_holdings(user, accounts=None):
+    """Returns (holdings, is_stale), holdings is None on a cache miss"""
+    cache = _cache()
+
+    entry = cache.get(_holdings_key(cache, user, accounts))
+
+    if entry is None:
+        return None, False
+
+    fetched_at, holdings = entry
+
+    return holdings, time.time() - fetched_at > _ttl()
+
+
+def set_cached_holdings(user, holdings, accounts=None):
+    cache = _cache()
+
+    # Entries outlive their TTL by the stale window so they can be served while a refresh runs
+    cache.set(_holdings_key(cache, user, accounts), (time.time(), holdings), _ttl() + _stale_ttl())
+
+
+def invalidate_holdings(user):
+    """Drops every cached holdings entry of user, whatever account filter it was stored under"""
+    _cache().set(GENERATION_KEY % user.pk, time.time_ns(), None)
+
+
+def claim_holdings_refresh(user, accounts=None):
+    """Returns True for the one caller allowed to refresh a stale entry"""
+    return _cache().add(REFRESH_KEY % (user.pk, _accounts_key(accounts)), True, 30)
+
+
+def release_holdings_refresh(user, accounts=None):
+    _cache().delete(REFRESH_KEY % (user.pk, _accounts_key(accounts)))
+
+
+def get_cached_rates():
+    return _cache().get(RATES_KEY)
+
+
+def set_cached_rates(rates):
+    _cache().set(RATES_KEY, rates, getattr(settings, "SNAPTRADE_FX_RATES_TTL", 3600))
+
+
+def pop_cached_login_redirect(user):
+    """Returns the prefetched login redirect response of user and drops it, a redirect URI can only be used once"""
+    cache = _cache()
+
+    redirect_uri_response = cache.get(LOGIN_REDIRECT_KEY % user.pk)
+
+    # Only the caller whose delete went through gets the URI when two clicks race for it
+    if redirect_uri_response is None or not cache.delete(LOGIN_REDIRECT_KEY % user.pk):
+        return None
+
+    return redirect_uri_response
+
+
+def set_cached_login_redirect(user, redirect_uri_response):
+    # Expires well within the validity window of the URI, so a cached one is always still redeemable
+    _cache().set(
+        LOGIN_REDIRECT_KEY % user.pk, redirect_uri_response, getattr(settings, "SNAPTRADE_LOGIN_REDIRECT_TTL", 240)
+    )
+
+
+def invalidate_login_redirect(user):
+    _cache().delete(LOGIN_REDIRECT_KEY % user.pk)
+
+
+def claim_login_redirect_prefetch(user):
+    """Returns True for the one caller allowed to prefetch a login redirect of user, False when one is cached"""
+    cache = _cache()
+
+    if cache.get(LOGIN_REDIRECT_KEY % user.pk) is not None:
+        return False
+
+    return cache.add(LOGIN_REDIRECT_PREFETCH_KEY % user.pk, True, 30)
+
+
+def release_login_redirect_prefetch(user):
+    _cache().delete(LOGIN_REDIRECT_PREFETCH_KEY % user.pk)
+
+
+def get_cached_user_secret(user_id):
+    """Token of the user from the process-local then the holdings cache, None on a miss"""
+    entry = _local_user_secrets.get(user_id)
+
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+
+    token = _cache().get(USER_SECRET_KEY % user_id)
+
+    if token is not None:
+        _set_local_user_secret(user_id, token)
+
+    return token
+
+
+def set_cached_user_secret(user_id, token):
+    # Only existing secrets are cached, a registration racing a lookup can not leave the user cached without one
+    _cache().set(USER_SECRET_KEY % user_id, token, getattr(settings, "SNAPTRADE_USER_SECRET_CACHE_TTL", 300))
+    _set_local_user_secret(user_id, token)
+
+
+def _set_local_user_secret(user_id, token):
+    if len(_local_user_secrets) >= LOCAL_USER_SECRETS_MAX:
+        _local_user_secrets.clear()
+
+    # Other processes keep a replaced or deleted token for at most USER_SECRET_LOCAL_TTL seconds
+    _local_user_secrets[user_id] = (time.monotonic() + getattr(settings, "SNAPTRADE_USER_SECRET_LOCAL_TTL", 5), token)
+
+
+def invalidate_user_secret(user_id):
+    _local_user_secrets.pop(user_id, None)
+    _cache().delete(USER_SECRET_KEY % user_id)
@@ -0,0 +1,95 @@
+"""
+Single-flight coalescing of identical upstream calls.
+
+While a call for a key is in flight, other callers with the same key wait
+for it and share its result (or its error) instead of sending their own.
+Sync and async callers share one table of flights, so a thread and an
+event loop asking for the same holdings at once cost a single request.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}
+
+    def _join(self, key):
+        """Returns the future of the flight for key and whether the caller has to run it"""
+        with self.lock:
+            future = self.flights.get(key)
+
+            if future is not None:
+                return future, False
+
+            future = self.flights[key] = Future()
+
+            return future, True
+
+    def _land(self, key, future, result=None, error=None):
+        with self.lock:
+            del self.flights[key]
+
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def do(self, key, func):
+        """Returns func(), or the result of the call of func already in flight for key"""
+        future, leader = self._join(key)
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = func()
+        except BaseException as error:
+            self._land(key, future, error=error)
+            raise
+
+        self._land(key, future, result)
+
+        return result
+
+    async def do_async(self, key, func):
+        """do for coroutine functions, the flight may have been started by a thread or another event loop"""
+        future, leader = self._join(key)
+
+        if not leader:
+            return await asyncio.wrap_future(future)
+
+        try:
+            result = await func()
+        except BaseException as error:
+            self._land(key, future, error=error)
+            raise
+
+        self._land(key, future, result)
+
+        return result
+
+    def in_flight(self):
+        with self.lock:
+            return len(self.flights)
+
+
+# Holdings fetches keyed by user and account filter, shared by every SnapTradeWrapper in the process
+holdings_flights = SingleFlight()
+
+
+def holdings_flight_key(user, accounts=None):
+    return user.pk, tuple(sorted(accounts)) if accounts else None
+
+
+def _reset_after_fork():
+    # A child must not wait on flights run by threads of its parent, reset in place as callers hold the object
+    holdings_flights.lock = threading.Lock()
+    holdings_flights.flights = {}
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,18 @@
+"""
+Per-connection database tuning.
+
+The SQLITE_PRAGMAS setting is run on every new SQLite connection, settings
+like synchronous and mmap_size only last as long as the connection.
+"""
+from django.conf import settings
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", None)
+
+    if connection.vendor != "sqlite" or not pragmas:
+        return
+
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute("PRAGMA %s = %s" % (name, value))
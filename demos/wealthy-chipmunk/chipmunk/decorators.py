@@ -0,0 +1,24 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+
+
+def _is_authenticated(request):
+    return request.user.is_authenticated
+
+
+def async_login_required(login_url=None):
+    """login_required for async views, the lazy request.user is resolved off the event loop"""
+
+    def decorator(view_func):
+        @wraps(view_func)
+        async def _wrapped_view(request, *args, **kwargs):
+            if await sync_to_async(_is_authenticated)(request):
+                return await view_func(request, *args, **kwargs)
+
+            return redirect_to_login(request.get_full_path(), login_url)
+
+        return _wrapped_view
+
+    return decorator
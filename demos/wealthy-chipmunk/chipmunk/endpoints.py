@@ -0,0 +1,564 @@
+"""
+SnapTrade API operations compiled from docs/api.yaml.
+
+Generated by `manage.py generate_endpoints`, do not edit by hand.
+
+Each operation lists its path split around the path params in "segments"
+(one more segment than path params) so building a request path is a join.
+"""
+
+ENDPOINTS = {
+    "get_root": {
+        "endpoint": "",
+        "method": "get",
+        "path_params": (),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("",),
+    },
+    "get_snap_trade_mock_signature": {
+        "endpoint": "snapTrade/mockSignature",
+        "method": "get",
+        "path_params": (),
+        "query_params": ("clientId", "timestamp"),
+        "required_query_params": (),
+        "segments": ("snapTrade/mockSignature",),
+    },
+    "post_snap_trade_mock_signature": {
+        "endpoint": "snapTrade/mockSignature",
+        "method": "post",
+        "path_params": (),
+        "query_params": ("clientId", "timestamp"),
+        "required_query_params": (),
+        "segments": ("snapTrade/mockSignature",),
+    },
+    "post_snap_trade_register_user": {
+        "endpoint": "snapTrade/registerUser",
+        "method": "post",
+        "path_params": (),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("snapTrade/registerUser",),
+    },
+    "post_snap_trade_delete_user": {
+        "endpoint": "snapTrade/deleteUser",
+        "method": "post",
+        "path_params": (),
+        "query_params": ("clientId", "userId", "timestamp"),
+        "required_query_params": ("clientId", "userId", "timestamp"),
+        "segments": ("snapTrade/deleteUser",),
+    },
+    "post_snap_trade_login": {
+        "endpoint": "snapTrade/login",
+        "method": "post",
+        "path_params": (),
+        "query_params": (
+            "clientId",
+            "userId",
+            "userSecret",
+            "timestamp",
+            "broker",
+            "immediateRedirect",
+            "customRedirect",
+        ),
+        "required_query_params": ("clientId", "userId", "userSecret", "timestamp"),
+        "segments": ("snapTrade/login",),
+    },
+    "get_holdings": {
+        "endpoint": "holdings",
+        "method": "get",
+        "path_params": (),
+        "query_params": ("clientId", "userId", "userSecret", "timestamp", "accounts"),
+        "required_query_params": ("clientId", "userId", "userSecret", "timestamp"),
+        "segments": ("holdings",),
+    },
+    "get_accounts": {
+        "endpoint": "accounts",
+        "method": "get",
+        "path_params": (),
+        "query_params": ("clientId", "userId", "userSecret", "timestamp"),
+        "required_query_params": ("clientId", "userId", "userSecret", "timestamp"),
+        "segments": ("accounts",),
+    },
+    "get_accounts_account_id": {
+        "endpoint": "accounts/%(accountId)s",
+        "method": "get",
+        "path_params": ("accountId",),
+        "query_params": ("clientId", "userId", "userSecret", "timestamp"),
+        "required_query_params": ("clientId", "userId", "userSecret", "timestamp"),
+        "segments": ("accounts/", ""),
+    },
+    "put_accounts_account_id": {
+        "endpoint": "accounts/%(accountId)s",
+        "method": "put",
+        "path_params": ("accountId",),
+        "query_params": ("clientId", "userId", "userSecret", "timestamp"),
+        "required_query_params": ("clientId", "userId", "userSecret", "timestamp"),
+        "segments": ("accounts/", ""),
+    },
+    "get_accounts_account_id_balances": {
+        "endpoint": "accounts/%(accountId)s/balances",
+        "method": "get",
+        "path_params": ("accountId",),
+        "query_params": ("clientId", "userId", "userSecret", "timestamp"),
+        "required_query_params": ("clientId", "userId", "userSecret", "timestamp"),
+        "segments": ("accounts/", "/balances"),
+    },
+    "get_accounts_account_id_positions": {
+        "endpoint": "accounts/%(accountId)s/positions",
+        "method": "get",
+        "path_params": ("accountId",),
+        "query_params": ("clientId", "userId", "userSecret", "timestamp"),
+        "required_query_params": ("clientId", "userId", "userSecret", "timestamp"),
+        "segments": ("accounts/", "/positions"),
+    },
+    "get_accounts_account_id_orders": {
+        "endpoint": "accounts/%(accountId)s/orders",
+        "method": "get",
+        "path_params": ("accountId",),
+        "query_params": ("clientId", "userId", "userSecret", "timestamp", "state", "days"),
+        "required_query_params": ("clientId", "userId", "userSecret", "timestamp"),
+        "segments": ("accounts/", "/orders"),
+    },
+    "get_accounts_account_id_quotes": {
+        "endpoint": "accounts/%(accountId)s/quotes",
+        "method": "get",
+        "path_params": ("accountId",),
+        "query_params": ("clientId", "userId", "userSecret", "timestamp", "symbolIds", "use_ticker"),
+        "required_query_params": ("clientId", "userId", "userSecret", "timestamp", "symbolIds"),
+        "segments": ("accounts/", "/quotes"),
+    },
+    "post_accounts_account_id_orders_cancel": {
+        "endpoint": "accounts/%(accountId)s/orders/cancel",
+        "method": "post",
+        "path_params": ("accountId",),
+        "query_params": ("clientId", "userId", "userSecret", "timestamp"),
+        "required_query_params": ("clientId", "userId", "userSecret", "timestamp"),
+        "segments": ("accounts/", "/orders/cancel"),
+    },
+    "get_authorizations": {
+        "endpoint": "authorizations",
+        "method": "get",
+        "path_params": (),
+        "query_params": ("clientId", "userId", "userSecret", "timestamp"),
+        "required_query_params": ("clientId", "userId", "userSecret", "timestamp"),
+        "segments": ("authorizations",),
+    },
+    "get_authorizations_authorization_id": {
+        "endpoint": "authorizations/%(authorizationId)s",
+        "method": "get",
+        "path_params": ("authorizationId",),
+        "query_params": ("clientId", "userId", "userSecret", "timestamp"),
+        "required_query_params": ("clientId", "userId", "userSecret", "timestamp"),
+        "segments": ("authorizations/", ""),
+    },
+    "delete_authorizations_authorization_id": {
+        "endpoint": "authorizations/%(authorizationId)s",
+        "method": "delete",
+        "path_params": ("authorizationId",),
+        "query_params": ("clientId", "userId", "userSecret", "timestamp"),
+        "required_query_params": ("clientId", "userId", "userSecret", "timestamp"),
+        "segments": ("authorizations/", ""),
+    },
+    "get_brokerages": {
+        "endpoint": "brokerages",
+        "method": "get",
+        "path_params": (),
+        "query_params": ("clientId", "timestamp"),
+        "required_query_params": ("clientId", "timestamp"),
+        "segments": ("brokerages",),
+    },
+    "get_currencies": {
+        "endpoint": "currencies",
+        "method": "get",
+        "path_params": (),
+        "query_params": ("clientId", "timestamp"),
+        "required_query_params": ("clientId", "timestamp"),
+        "segments": ("currencies",),
+    },
+    "get_currencies_rates": {
+        "endpoint": "currencies/rates",
+        "method": "get",
+        "path_params": (),
+        "query_params": ("clientId", "timestamp"),
+        "required_query_params": ("clientId", "timestamp"),
+        "segments": ("currencies/rates",),
+    },
+    "get_currencies_rates_currency_pair": {
+        "endpoint": "currencies/rates/%(currencyPair)s",
+        "method": "get",
+        "path_params": ("currencyPair",),
+        "query_params": ("clientId", "timestamp"),
+        "required_query_params": ("clientId", "timestamp"),
+        "segments": ("currencies/rates/", ""),
+    },
+    "get_exchanges": {
+        "endpoint": "exchanges",
+        "method": "get",
+        "path_params": (),
+        "query_params": ("clientId", "timestamp"),
+        "required_query_params": ("clientId", "timestamp"),
+        "segments": ("exchanges",),
+    },
+    "get_model_asset_class": {
+        "endpoint": "modelAssetClass",
+        "method": "get",
+        "path_params": (),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("modelAssetClass",),
+    },
+    "post_model_asset_class": {
+        "endpoint": "modelAssetClass",
+        "method": "post",
+        "path_params": (),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("modelAssetClass",),
+    },
+    "get_model_asset_class_model_asset_class_id": {
+        "endpoint": "modelAssetClass/%(modelAssetClassId)s",
+        "method": "get",
+        "path_params": ("modelAssetClassId",),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("modelAssetClass/", ""),
+    },
+    "post_model_asset_class_model_asset_class_id": {
+        "endpoint": "modelAssetClass/%(modelAssetClassId)s",
+        "method": "post",
+        "path_params": ("modelAssetClassId",),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("modelAssetClass/", ""),
+    },
+    "delete_model_asset_class_model_asset_class_id": {
+        "endpoint": "modelAssetClass/%(modelAssetClassId)s",
+        "method": "delete",
+        "path_params": ("modelAssetClassId",),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("modelAssetClass/", ""),
+    },
+    "get_model_portfolio": {
+        "endpoint": "modelPortfolio",
+        "method": "get",
+        "path_params": (),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("modelPortfolio",),
+    },
+    "post_model_portfolio": {
+        "endpoint": "modelPortfolio",
+        "method": "post",
+        "path_params": (),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("modelPortfolio",),
+    },
+    "get_model_portfolio_model_portfolio_id": {
+        "endpoint": "modelPortfolio/%(modelPortfolioId)s",
+        "method": "get",
+        "path_params": ("modelPortfolioId",),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("modelPortfolio/", ""),
+    },
+    "post_model_portfolio_model_portfolio_id": {
+        "endpoint": "modelPortfolio/%(modelPortfolioId)s",
+        "method": "post",
+        "path_params": ("modelPortfolioId",),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("modelPortfolio/", ""),
+    },
+    "delete_model_portfolio_model_portfolio_id": {
+        "endpoint": "modelPortfolio/%(modelPortfolioId)s",
+        "method": "delete",
+        "path_params": ("modelPortfolioId",),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("modelPortfolio/", ""),
+    },
+    "get_portfolio_groups": {
+        "endpoint": "portfolioGroups",
+        "method": "get",
+        "path_params": (),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("portfolioGroups",),
+    },
+    "post_portfolio_groups": {
+        "endpoint": "portfolioGroups",
+        "method": "post",
+        "path_params": (),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("portfolioGroups",),
+    },
+    "get_portfolio_groups_portfolio_group_id": {
+        "endpoint": "portfolioGroups/%(portfolioGroupId)s",
+        "method": "get",
+        "path_params": ("portfolioGroupId",),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("portfolioGroups/", ""),
+    },
+    "patch_portfolio_groups_portfolio_group_id": {
+        "endpoint": "portfolioGroups/%(portfolioGroupId)s",
+        "method": "patch",
+        "path_params": ("portfolioGroupId",),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("portfolioGroups/", ""),
+    },
+    "delete_portfolio_groups_portfolio_group_id": {
+        "endpoint": "portfolioGroups/%(portfolioGroupId)s",
+        "method": "delete",
+        "path_params": ("portfolioGroupId",),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("portfolioGroups/", ""),
+    },
+    "get_portfolio_groups_portfolio_group_id_accounts": {
+        "endpoint": "portfolioGroups/%(portfolioGroupId)s/accounts",
+        "method": "get",
+        "path_params": ("portfolioGroupId",),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("portfolioGroups/", "/accounts"),
+    },
+    "get_portfolio_groups_portfolio_group_id_balances": {
+        "endpoint": "portfolioGroups/%(portfolioGroupId)s/balances",
+        "method": "get",
+        "path_params": ("portfolioGroupId",),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("portfolioGroups/", "/balances"),
+    },
+    "get_portfolio_groups_portfolio_group_id_calculatedtrades": {
+        "endpoint": "portfolioGroups/%(portfolioGroupId)s/calculatedtrades",
+        "method": "get",
+        "path_params": ("portfolioGroupId",),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("portfolioGroups/", "/calculatedtrades"),
+    },
+    "get_portfolio_groups_portfolio_group_id_calculatedtrades_calculated_trade_id_trade_id": {
+        "endpoint": "portfolioGroups/%(portfolioGroupId)s/calculatedtrades/%(calculatedTradeId)s/%(TradeId)s",
+        "method": "get",
+        "path_params": ("portfolioGroupId", "calculatedTradeId", "TradeId"),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("portfolioGroups/", "/calculatedtrades/", "/", ""),
+    },
+    "get_portfolio_groups_portfolio_group_id_calculatedtrades_calculated_trade_id_impact": {
+        "endpoint": "portfolioGroups/%(portfolioGroupId)s/calculatedtrades/%(calculatedTradeId)s/impact",
+        "method": "get",
+        "path_params": ("portfolioGroupId", "calculatedTradeId"),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("portfolioGroups/", "/calculatedtrades/", "/impact"),
+    },
+    "get_portfolio_groups_portfolio_group_id_calculatedtrades_calculated_trade_id_modify_trade_id": {
+        "endpoint": "portfolioGroups/%(portfolioGroupId)s/calculatedtrades/%(calculatedTradeId)s/modify/%(tradeId)s",
+        "method": "get",
+        "path_params": ("portfolioGroupId", "calculatedTradeId", "tradeId"),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("portfolioGroups/", "/calculatedtrades/", "/modify/", ""),
+    },
+    "patch_portfolio_groups_portfolio_group_id_calculatedtrades_calculated_trade_id_modify_trade_id": {
+        "endpoint": "portfolioGroups/%(portfolioGroupId)s/calculatedtrades/%(calculatedTradeId)s/modify/%(tradeId)s",
+        "method": "patch",
+        "path_params": ("portfolioGroupId", "calculatedTradeId", "tradeId"),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("portfolioGroups/", "/calculatedtrades/", "/modify/", ""),
+    },
+    "post_portfolio_groups_portfolio_group_id_calculatedtrades_calculated_trade_id_place_orders": {
+        "endpoint": "portfolioGroups/%(portfolioGroupId)s/calculatedtrades/%(calculatedTradeId)s/placeOrders",
+        "method": "post",
+        "path_params": ("portfolioGroupId", "calculatedTradeId"),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("portfolioGroups/", "/calculatedtrades/", "/placeOrders"),
+    },
+    "get_portfolio_groups_portfolio_group_id_excludedassets": {
+        "endpoint": "portfolioGroups/%(portfolioGroupId)s/excludedassets",
+        "method": "get",
+        "path_params": ("portfolioGroupId",),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("portfolioGroups/", "/excludedassets"),
+    },
+    "post_portfolio_groups_portfolio_group_id_excludedassets": {
+        "endpoint": "portfolioGroups/%(portfolioGroupId)s/excludedassets",
+        "method": "post",
+        "path_params": ("portfolioGroupId",),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("portfolioGroups/", "/excludedassets"),
+    },
+    "delete_portfolio_groups_portfolio_group_id_excludedassets_symbol_id": {
+        "endpoint": "portfolioGroups/%(portfolioGroupId)s/excludedassets/%(symbolId)s",
+        "method": "delete",
+        "path_params": ("portfolioGroupId", "symbolId"),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("portfolioGroups/", "/excludedassets/", ""),
+    },
+    "post_portfolio_groups_portfolio_group_id_import": {
+        "endpoint": "portfolioGroups/%(portfolioGroupId)s/import",
+        "method": "post",
+        "path_params": ("portfolioGroupId",),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("portfolioGroups/", "/import"),
+    },
+    "get_portfolio_groups_portfolio_group_id_info": {
+        "endpoint": "portfolioGroups/%(portfolioGroupId)s/info",
+        "method": "get",
+        "path_params": ("portfolioGroupId",),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("portfolioGroups/", "/info"),
+    },
+    "get_portfolio_groups_portfolio_group_id_positions": {
+        "endpoint": "portfolioGroups/%(portfolioGroupId)s/positions",
+        "method": "get",
+        "path_params": ("portfolioGroupId",),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("portfolioGroups/", "/positions"),
+    },
+    "get_portfolio_groups_portfolio_group_id_settings": {
+        "endpoint": "portfolioGroups/%(portfolioGroupId)s/settings",
+        "method": "get",
+        "path_params": ("portfolioGroupId",),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("portfolioGroups/", "/settings"),
+    },
+    "patch_portfolio_groups_portfolio_group_id_settings": {
+        "endpoint": "portfolioGroups/%(portfolioGroupId)s/settings",
+        "method": "patch",
+        "path_params": ("portfolioGroupId",),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("portfolioGroups/", "/settings"),
+    },
+    "post_portfolio_groups_portfolio_group_id_symbols": {
+        "endpoint": "portfolioGroups/%(portfolioGroupId)s/symbols",
+        "method": "post",
+        "path_params": ("portfolioGroupId",),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("portfolioGroups/", "/symbols"),
+    },
+    "get_portfolio_groups_portfolio_group_id_targets": {
+        "endpoint": "portfolioGroups/%(portfolioGroupId)s/targets",
+        "method": "get",
+        "path_params": ("portfolioGroupId",),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("portfolioGroups/", "/targets"),
+    },
+    "post_portfolio_groups_portfolio_group_id_targets": {
+        "endpoint": "portfolioGroups/%(portfolioGroupId)s/targets",
+        "method": "post",
+        "path_params": ("portfolioGroupId",),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("portfolioGroups/", "/targets"),
+    },
+    "get_portfolio_groups_portfolio_group_id_targets_target_asset_id": {
+        "endpoint": "portfolioGroups/%(portfolioGroupId)s/targets/%(targetAssetId)s",
+        "method": "get",
+        "path_params": ("portfolioGroupId", "targetAssetId"),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("portfolioGroups/", "/targets/", ""),
+    },
+    "patch_portfolio_groups_portfolio_group_id_targets_target_asset_id": {
+        "endpoint": "portfolioGroups/%(portfolioGroupId)s/targets/%(targetAssetId)s",
+        "method": "patch",
+        "path_params": ("portfolioGroupId", "targetAssetId"),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("portfolioGroups/", "/targets/", ""),
+    },
+    "delete_portfolio_groups_portfolio_group_id_targets_target_asset_id": {
+        "endpoint": "portfolioGroups/%(portfolioGroupId)s/targets/%(targetAssetId)s",
+        "method": "delete",
+        "path_params": ("portfolioGroupId", "targetAssetId"),
+        "query_params": (),
+        "required_query_params": (),
+        "segments": ("portfolioGroups/", "/targets/", ""),
+    },
+    "post_symbols": {
+        "endpoint": "symbols",
+        "method": "post",
+        "path_params": (),
+        "query_params": ("clientId", "timestamp"),
+        "required_query_params": ("clientId", "timestamp"),
+        "segments": ("symbols",),
+    },
+    "get_symbols_symbol_id": {
+        "endpoint": "symbols/%(symbolId)s",
+        "method": "get",
+        "path_params": ("symbolId",),
+        "query_params": ("clientId", "timestamp"),
+        "required_query_params": ("clientId", "timestamp"),
+        "segments": ("symbols/", ""),
+    },
+    "get_symbols_ticker": {
+        "endpoint": "symbols/%(ticker)s",
+        "method": "get",
+        "path_params": ("ticker",),
+        "query_params": ("clientId", "timestamp"),
+        "required_query_params": ("clientId", "timestamp"),
+        "segments": ("symbols/", ""),
+    },
+    "post_trade_impact": {
+        "endpoint": "trade/impact",
+        "method": "post",
+        "path_params": (),
+        "query_params": ("clientId", "userId", "userSecret", "timestamp"),
+        "required_query_params": ("clientId", "userId", "userSecret", "timestamp"),
+        "segments": ("trade/impact",),
+    },
+    "post_trade_trade_id": {
+        "endpoint": "trade/%(tradeId)s",
+        "method": "post",
+        "path_params": ("tradeId",),
+        "query_params": ("clientId", "userId", "userSecret", "timestamp"),
+        "required_query_params": ("clientId", "userId", "userSecret", "timestamp"),
+        "segments": ("trade/", ""),
+    },
+    "get_activities": {
+        "endpoint": "activities/",
+        "method": "get",
+        "path_params": (),
+        "query_params": ("startDate", "endDate", "clientId", "userId", "userSecret", "timestamp"),
+        "required_query_params": ("clientId", "userId", "userSecret", "timestamp"),
+        "segments": ("activities/",),
+    },
+    "get_performance_custom": {
+        "endpoint": "performance/custom",
+        "method": "get",
+        "path_params": (),
+        "query_params": (
+            "startDate",
+            "endDate",
+            "accounts",
+            "frequency",
+            "clientId",
+            "userId",
+            "userSecret",
+            "timestamp",
+        ),
+        "required_query_params": ("startDate", "endDate", "clientId", "userId", "userSecret", "timestamp"),
+        "segments": ("performance/custom",),
+    },
+}
@@ -0,0 +1,231 @@
+"""
+Normalized storage of SnapTrade holdings payloads.
+
+A /holdings response (or the fan-out equivalent) is flattened into one
+Position row per (account, symbol) and one Balance row per (account,
+currency). A refresh is diffed against the stored rows of its accounts and
+only added, removed and changed rows are written, with bulk queries, along
+with one HoldingsChange feed entry per changed account. A refresh that loses
+a race with another one for the same accounts is diffed again against what
+the other one committed.
+"""
+import itertools
+
+from chipmunk.models import Account, Balance, HoldingsChange, Position
+from django.db import IntegrityError, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+# Sent once a refresh that changed holdings is committed, with user and changes, the new HoldingsChange rows
+holdings_changed = Signal()
+
+# Diffs of a refresh whose writes keep conflicting with concurrent ones before the IntegrityError is raised
+STORE_ATTEMPTS = 3
+
+# Feed section, row key and compared fields of the tracked models
+TRACKED = {
+    Position: ("positions", "symbol", ("description", "units", "price", "currency")),
+    Balance: ("balances", "currency", ("cash",)),
+}
+
+
+def position_fields(position):
+    """Position payload to Position model fields"""
+    symbol = position.get("symbol") or {}
+
+    # The current payload nests the UniversalSymbol under a PositionSymbol, the legacy one does not
+    universal_symbol = symbol.get("symbol") if isinstance(symbol.get("symbol"), dict) else symbol
+    currency = universal_symbol.get("currency") or {}
+
+    units = position.get("units")
+    if units is None:
+        units = position.get("fractional_units")
+
+    return dict(
+        symbol=universal_symbol.get("symbol") or "",
+        description=universal_symbol.get("description") or symbol.get("description") or "",
+        units=units or 0.0,
+        price=position.get("price") or 0.0,
+        currency=currency.get("code") or "",
+    )
+
+
+def balance_fields(balance):
+    """Balance payload to Balance model fields"""
+    return dict(currency=(balance.get("currency") or {}).get("code") or "", cash=balance.get("cash") or 0.0)
+
+
+def merge_positions(positions, position_payloads):
+    """Adds position payloads to positions keyed by symbol, units of a symbol listed twice add up"""
+    for position in position_payloads or ():
+        fields = position_fields(position)
+        merged = positions.get(fields["symbol"])
+        if merged is None:
+            positions[fields["symbol"]] = fields
+        else:
+            merged["units"] += fields["units"]
+
+    return positions
+
+
+def merge_balances(balances, balance_payloads):
+    """Adds balance payloads to balances keyed by currency code, cash of a currency listed twice adds up"""
+    for balance in balance_payloads or ():
+        fields = balance_fields(balance)
+        merged = balances.get(fields["currency"])
+        if merged is None:
+            balances[fields["currency"]] = fields
+        else:
+            merged["cash"] += fields["cash"]
+
+    return balances
+
+
+def normalize_holdings(user, accounts_holdings):
+    """
+    Returns {account: (positions, balances)} for accounts_holdings, with the
+    positions keyed by symbol and the balances by currency code. Payload
+    entries for the same account are merged.
+    """
+    accounts = Account.bulk_upsert(user, [holdings.get("account") or {} for holdings in accounts_holdings])
+
+    normalized = {}
+
+    for account_holdings in accounts_holdings:
+        account = accounts.get(Account.key_of(account_holdings.get("account") or {}))
+        if account is None:
+            continue
+
+        positions, balances = normalized.setdefault(account, ({}, {}))
+        merge_positions(positions, account_holdings.get("positions"))
+        merge_balances(balances, account_holdings.get("balances"))
+
+    return normalized
+
+
+class ChangeSet:
+    """
+    The row writes turning the stored positions and balances of some accounts
+    into a fresh payload, and the per-account feed entries describing them.
+    """
+
+    def __init__(self, user, synced_at):
+        self.user = user
+        self.synced_at = synced_at
+        self.created = {Position: [], Balance: []}
+        self.updated = {Position: [], Balance: []}
+        self.deleted = {Position: [], Balance: []}
+        self.changes = {}
+
+    def __bool__(self):
+        return bool(self.changes)
+
+    def record(self, account, model, action, entry):
+        changes = self.changes.setdefault(account, {})
+        changes.setdefault(TRACKED[model][0], {}).setdefault(action, []).append(entry)
+
+    def diff(self, account, model, stored, fresh):
+        """Compares stored rows of account keyed like fresh, the normalized payload rows"""
+        _, key_field, compared = TRACKED[model]
+
+        for key, fields in fresh.items():
+            row = stored.get(key)
+
+            if row is None:
+                self.created[model].append(model(user=self.user, account=account, synced_at=self.synced_at, **fields))
+                self.record(account, model, "added", fields)
+                continue
+
+            before = {name: getattr(row, name) for name in compared if getattr(row, name) != fields[name]}
+
+            if before:
+                after = {name: fields[name] for name in before}
+                for name, value in after.items():
+                    setattr(row, name, value)
+                row.synced_at = self.synced_at
+                self.updated[model].append(row)
+                self.record(account, model, "changed", {key_field: key, "before": before, "after": after})
+
+        for key, row in stored.items():
+            if key not in fresh:
+                self.deleted[model].append(row.pk)
+                self.record(account, model, "removed", {key_field: key})
+
+    def apply(self):
+        """Writes the changed rows and the feed entries, returns the HoldingsChange rows"""
+        feed = [
+            HoldingsChange(user=self.user, account=account, changes=changes, created_at=self.synced_at)
+            for account, changes in self.changes.items()
+        ]
+
+        with transaction.atomic():
+            for model in (Position, Balance):
+                _, _, compared = TRACKED[model]
+                if self.deleted[model]:
+                    model.objects.filter(pk__in=self.deleted[model]).delete()
+                if self.updated[model]:
+                    model.objects.bulk_update(self.updated[model], list(compared) + ["synced_at"])
+                if self.created[model]:
+                    model.objects.bulk_create(self.created[model])
+
+            # One row per changed account, saved one by one so every backend sets their ids
+            for change in feed:
+                change.save()
+
+            transaction.on_commit(lambda: holdings_changed.send(sender=HoldingsChange, user=self.user, changes=feed))
+
+        return feed
+
+
+def stored_rows(model, account_ids):
+    """{account id: {key: row}} of the stored rows of model"""
+    _, key_field, _ = TRACKED[model]
+
+    rows = {}
+    for row in model.objects.filter(account_id__in=account_ids):
+        rows.setdefault(row.account_id, {})[getattr(row, key_field)] = row
+
+    return rows
+
+
+def diff_holdings(user, normalized, synced_at=None):
+    """Returns the ChangeSet between the stored rows of the accounts in normalized and normalized"""
+    change_set = ChangeSet(user, synced_at or timezone.now())
+
+    account_ids = [account.pk for account in normalized]
+    stored_positions = stored_rows(Position, account_ids)
+    stored_balances = stored_rows(Balance, account_ids)
+
+    for account, (positions, balances) in normalized.items():
+        change_set.diff(account, Position, stored_positions.get(account.pk, {}), positions)
+        change_set.diff(account, Balance, stored_balances.get(account.pk, {}), balances)
+
+    return change_set
+
+
+def store_holdings(user, accounts_holdings, synced_at=None):
+    """
+    Brings the stored positions and balances of every account present in
+    accounts_holdings up to date, writing only the rows that changed, and
+    returns the HoldingsChange feed entries of the refresh. Accounts missing
+    from the payload keep their rows, a filtered /holdings call must not
+    wipe the others.
+    """
+    normalized = normalize_holdings(user, accounts_holdings)
+
+    if not normalized:
+        return []
+
+    for attempt in itertools.count(1):
+        change_set = diff_holdings(user, normalized, synced_at)
+
+        if not change_set:
+            return []
+
+        try:
+            return change_set.apply()
+        except IntegrityError:
+            # A concurrent refresh inserted some of the same rows after they were read, the whole
+            # change set was rolled back and is diffed again against the committed rows
+            if attempt >= STORE_ATTEMPTS:
+                raise
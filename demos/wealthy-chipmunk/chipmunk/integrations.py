@@ -1,21 +1,59 @@
-import hmac
-import json
+import asyncio
+import itertools
+import logging
+import threading
 import time
-from base64 import b64encode
-from hashlib import sha256
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
 from urllib.parse import urlencode
 
+import httpx
 import requests
-from chipmunk.models import Account, UserManager, UserSecret
-
-from snaptrade_mock import settings
+from asgiref.sync import sync_to_async
+from chipmunk.caching import (
+    claim_holdings_refresh,
+    claim_login_redirect_prefetch,
+    get_cached_holdings,
+    get_cached_rates,
+    invalidate_holdings,
+    invalidate_login_redirect,
+    pop_cached_login_redirect,
+    release_holdings_refresh,
+    release_login_redirect_prefetch,
+    set_cached_holdings,
+    set_cached_login_redirect,
+    set_cached_rates,
+)
+from chipmunk.coalescing import holdings_flight_key, holdings_flights
+from chipmunk.endpoints import ENDPOINTS
+from chipmunk.holdings import store_holdings
+from chipmunk.models import HoldingsSnapshot, UserSecret
+from chipmunk.portfolio import Portfolio
+from chipmunk.ratelimit import BACKGROUND, INTERACTIVE, get_scheduler, retry_after
+from chipmunk.resilience import (
+    IDEMPOTENT_METHODS,
+    RetryPolicy,
+    UpstreamUnavailable,
+    get_breaker,
+    hedged,
+    hedged_async,
+)
+from chipmunk.signing import get_signer
+from chipmunk.transport import async_host_slot, get_async_client, get_session, host_slot
+from chipmunk.valuation import RateMatrix, Valuation
+from django.conf import settings
+from django.db import DatabaseError, connection
+
+logger = logging.getLogger(__name__)
 
 
 class SnapTradeWrapper:
     # base_url = "https://api.delta.passiv.com/api/v1/"
     base_url = "https://api.passiv.com/api/v1/"
 
+    # Every operation of docs/api.yaml, plus the names the wrapper has always used
     endpoints = {
+        **ENDPOINTS,
         "register": {
             "endpoint": "snapTrade/registerUser",
             "method": "post",
@@ -24,6 +62,7 @@ class SnapTradeWrapper:
                 "partner_id",
                 "timestamp",
             ),
+            "segments": ("snapTrade/registerUser",),
         },
         "login": {
             "endpoint": "snapTrade/login",
@@ -33,6 +72,7 @@ class SnapTradeWrapper:
                 "partner_id",
                 "timestamp",
             ),
+            "segments": ("snapTrade/login",),
         },
         "delete_user": {
             "endpoint": "snapTrade/deleteUser",
@@ -42,32 +82,44 @@ class SnapTradeWrapper:
                 "partner_id",
                 "timestamp",
             ),
+            "segments": ("snapTrade/deleteUser",),
         },
         "holdings": {
             "endpoint": "snapTrade/holdings",
             "method": "get",
             "path_params": (),
             "query_params": ("partner_id", "timestamp", "accounts", "userId"),
+            "segments": ("snapTrade/holdings",),
         },
+        "accounts": ENDPOINTS["get_accounts"],
+        "account_balances": ENDPOINTS["get_accounts_account_id_balances"],
+        "account_positions": ENDPOINTS["get_accounts_account_id_positions"],
+        "account_orders": ENDPOINTS["get_accounts_account_id_orders"],
+    }
+
+    # Operations whose slow calls are hedged after SNAPTRADE_HEDGE_AFTER seconds
+    hedged_endpoints = ("holdings",)
+
+    # Per-account resources merged into the AccountHoldings shape by the fan-out path
+    account_resources = {
+        "balances": "account_balances",
+        "positions": "account_positions",
+        "orders": "account_orders",
     }
 
-    def __init__(self, user):
+    def __init__(self, user, priority=INTERACTIVE):
         self.snaptrade_consumer_key = settings.SNAPTRADE_PROD_CONSUMER_KEY.encode()
         self.snaptrade_partner_id = settings.SNAPTRADE_PROD_PARTNER_ID
         # self.snaptrade_consumer_key = settings.SNAPTRADE_DELTA_CONSUMER_KEY.encode()
         # self.snaptrade_partner_id = settings.SNAPTRADE_DELTA_PARTNER_ID
         self.user = user
+        # Rate limit priority class, background work queues behind calls a user is waiting on
+        self.priority = priority
+        self.signer = get_signer(self.snaptrade_consumer_key)
+        self.base_url = getattr(settings, "SNAPTRADE_BASE_URL", self.base_url)
 
     def sign_request(self, request_data, request_path, request_query):
-        sig_object = {"content": request_data, "path": request_path, "query": request_query}
-
-        sig_content = json.dumps(sig_object, separators=(",", ":"), sort_keys=True)
-
-        sig_digest = hmac.new(self.snaptrade_consumer_key, sig_content.encode(), sha256).digest()
-
-        signature = b64encode(sig_digest).decode()
-
-        return signature
+        return self.signer.sign(request_data, request_path, request_query)
 
     def get_signature(self, request_data, request_path=None, request_query=None):
         if request_query:
@@ -77,78 +129,221 @@ class SnapTradeWrapper:
 
         return self.sign_request(request_data, request_path, request_query_string)
 
-    def _generate_request_path(self, endpoint_name, **path_params):
-        """Generates API endpoint based on endpoint_name and params given"""
+    def _generate_path(self, endpoint_name, path_params):
+        """Joins the precompiled path segments of endpoint_name around the given path params"""
         endpoint = self.endpoints[endpoint_name]
+        segments = endpoint["segments"]
 
-        return "/api/v1/%s" % (endpoint["endpoint"] % path_params)
+        if len(segments) == 1:
+            return segments[0]
 
-    def _generate_api_endpoint(self, endpoint_name, **path_params):
+        parts = [segments[0]]
+        for name, segment in zip(endpoint["path_params"], segments[1:]):
+            parts.append(str(path_params[name]))
+            parts.append(segment)
+
+        return "".join(parts)
+
+    def _generate_request_path(self, endpoint_name, **path_params):
         """Generates API endpoint based on endpoint_name and params given"""
-        endpoint = self.endpoints[endpoint_name]
+        return "/api/v1/%s" % self._generate_path(endpoint_name, path_params)
 
-        return "%s%s" % (self.base_url, endpoint["endpoint"] % path_params)
+    def _generate_api_endpoint(self, endpoint_name, **path_params):
+        """Generates API endpoint based on endpoint_name and params given"""
+        return "%s%s" % (self.base_url, self._generate_path(endpoint_name, path_params))
 
-    def _make_request(self, endpoint_name, data=None, path_params=None, query_params=None, basic_auth=False):
+    def _prepare_request(self, endpoint_name, data=None, path_params=None, query_params=None):
+        """Returns the method, url and signed headers shared by the sync and async transports"""
         if path_params is None:
             path_params = {}
 
-        request_path = self._generate_request_path(endpoint_name, **path_params)
+        path = self._generate_path(endpoint_name, path_params)
 
-        signature = self.get_signature(data, request_path, query_params)
+        signature = self.get_signature(data, "/api/v1/%s" % path, query_params)
 
-        endpoint = self._generate_api_endpoint(endpoint_name, **path_params)
+        endpoint = "%s%s" % (self.base_url, path)
 
         headers = {"Signature": signature}
 
         method = self.endpoints[endpoint_name]["method"]
 
-        if method == "post":
-            response = requests.post(endpoint, headers=headers, params=query_params, json=data, verify=False)
-        elif method == "get":
-            response = requests.get(endpoint, headers=headers, params=query_params, verify=False)
-        elif method == "delete":
-            response = requests.delete(
-                endpoint, headers=headers, params=query_params, verify=False, auth=generated_auth
-            )
+        return method, endpoint, headers
+
+    def _call_query_params(self, endpoint_name, query_params=None, token=None):
+        """Fills in the credentials an operation requires, explicit query_params win"""
+        required = self.endpoints[endpoint_name].get("required_query_params", ())
+
+        call_query_params = {}
+
+        if "clientId" in required:
+            call_query_params["clientId"] = self.snaptrade_partner_id
+        if "userId" in required:
+            call_query_params["userId"] = self.user.email
+        if "userSecret" in required and token is not None:
+            call_query_params["userSecret"] = token
+        if "timestamp" in required:
+            call_query_params["timestamp"] = round(time.time())
+
+        if query_params:
+            call_query_params.update(query_params)
+
+        missing = [name for name in required if name not in call_query_params]
+        if missing:
+            raise ValueError("%s requires query params %s" % (endpoint_name, ", ".join(missing)))
+
+        return call_query_params
+
+    def call(self, endpoint_name, data=None, path_params=None, query_params=None):
+        """Calls any operation of the endpoints registry and returns the raw response"""
+        token = None
+        if "userSecret" in self.endpoints[endpoint_name].get("required_query_params", ()):
+            token = UserSecret.get_token_by_user(self.user)
+
+        query_params = self._call_query_params(endpoint_name, query_params, token)
+
+        return self._make_request(endpoint_name, data=data, path_params=path_params, query_params=query_params)
+
+    def _rate_limit_max_wait(self):
+        """Interactive calls give up after SNAPTRADE_RATE_LIMIT_MAX_WAIT seconds, background ones wait their turn"""
+        if self.priority == BACKGROUND:
+            return None
+
+        return getattr(settings, "SNAPTRADE_RATE_LIMIT_MAX_WAIT", 10)
+
+    def _record_rate_limit(self, response):
+        if response.status_code == 429:
+            get_scheduler().throttled(self.snaptrade_partner_id, retry_after(response))
+
+    def _hedge_after(self, endpoint_name, method):
+        if endpoint_name in self.hedged_endpoints and method in IDEMPOTENT_METHODS:
+            return getattr(settings, "SNAPTRADE_HEDGE_AFTER", None)
+
+        return None
+
+    def _hedge_allowed(self, endpoint_name):
+        """A hedge never queues for a token, it is skipped under rate limit pressure instead"""
+        return get_scheduler().try_acquire(self.snaptrade_partner_id, endpoint_name, self.priority)
+
+    def _send(self, method, endpoint, headers, query_params, data):
+        response = get_session().request(
+            method,
+            endpoint,
+            headers=headers,
+            params=query_params,
+            json=data,
+            timeout=getattr(settings, "SNAPTRADE_TIMEOUT", 10),
+        )
+
+        self._record_rate_limit(response)
 
         return response
 
-    def register_user(self):
-        endpoint = "register"
+    def _breaker_key(self, query_params):
+        """Calls made for a user share a breaker key, so a user whose accounts keep failing only counts once"""
+        if query_params and "userId" in query_params:
+            return self.user.pk
+
+        return None
 
+    def _make_request(self, endpoint_name, data=None, path_params=None, query_params=None, basic_auth=False):
+        """
+        Sends the request, retrying idempotent ones on transport errors and
+        retryable statuses. Raises UpstreamUnavailable when no response came
+        back and CircuitOpen while the operation's breaker is open.
+        """
+        method, endpoint, headers = self._prepare_request(endpoint_name, data, path_params, query_params)
+
+        send = partial(self._send, method, endpoint, headers, query_params, data)
+        hedge_after = self._hedge_after(endpoint_name, method)
+        breaker = get_breaker(endpoint_name)
+        policy = RetryPolicy.from_settings()
+
+        breaker_key = self._breaker_key(query_params)
+
+        breaker.before_call()
+
+        for attempt in itertools.count():
+            get_scheduler().acquire(
+                self.snaptrade_partner_id, endpoint_name, self.priority, self._rate_limit_max_wait()
+            )
+
+            try:
+                if hedge_after is None:
+                    response = send()
+                else:
+                    response = hedged(send, hedge_after, partial(self._hedge_allowed, endpoint_name))
+            except (requests.ConnectionError, requests.Timeout) as error:
+                delay = policy.retry_delay(method, attempt)
+                if delay is None:
+                    breaker.record(key=breaker_key)
+                    raise UpstreamUnavailable("%s failed: %s" % (endpoint_name, error)) from error
+            else:
+                delay = policy.retry_delay(method, attempt, response.status_code)
+                if delay is None:
+                    breaker.record(response.status_code, breaker_key)
+                    return response
+
+            time.sleep(delay)
+
+    def _register_user_request(self):
         partner_id = self.snaptrade_partner_id
         timestamp = round(time.time())
 
         query_params = dict(partnerId=partner_id, timestamp=timestamp)
         data = dict(userId=self.user.email)
 
-        response = self._make_request(endpoint, query_params=query_params, data=data)
+        return dict(query_params=query_params, data=data)
 
+    def _register_user_response(self, response):
         if response.status_code == 200:
             token = response.json().get("userSecret")
             UserSecret.save_token(self.user, token)
+            # Keeps the user_secret attached by UserSecretMiddleware current
+            self.user.user_secret = token
+            invalidate_holdings(self.user)
+            invalidate_login_redirect(self.user)
+            HoldingsSnapshot.expire(self.user)
 
-    def delete_user(self):
-        endpoint = "delete_user"
+    def register_user(self):
+        endpoint = "register"
+
+        response = self._make_request(endpoint, **self._register_user_request())
+
+        self._register_user_response(response)
 
+    def _delete_user_request(self):
         partner_id = self.snaptrade_partner_id
         timestamp = round(time.time())
 
         user_secret_obj = UserSecret.objects.filter(user=self.user).first()
 
-        if user_secret_obj:
-            token = user_secret_obj.token
-            query_params = dict(partnerId=partner_id, timestamp=timestamp)
-            data = dict(userId=self.user.email, userSecret=token)
-            response = self._make_request(endpoint, data=data, query_params=query_params)
+        if not user_secret_obj:
+            return None, None
+
+        token = user_secret_obj.token
+        query_params = dict(partnerId=partner_id, timestamp=timestamp)
+        data = dict(userId=self.user.email, userSecret=token)
 
+        return user_secret_obj, dict(data=data, query_params=query_params)
+
+    def _delete_user_response(self, user_secret_obj, response):
         if response.status_code == 200:
             user_secret_obj.delete()
+            self.user.user_secret = None
+            invalidate_holdings(self.user)
+            invalidate_login_redirect(self.user)
+            HoldingsSnapshot.expire(self.user)
 
-    def login_user_redirect(self):
-        endpoint = "login"
+    def delete_user(self):
+        endpoint = "delete_user"
+
+        user_secret_obj, request_kwargs = self._delete_user_request()
+
+        if user_secret_obj:
+            response = self._make_request(endpoint, **request_kwargs)
+            self._delete_user_response(user_secret_obj, response)
 
+    def _login_user_request(self):
         partner_id = self.snaptrade_partner_id
         timestamp = round(time.time())
 
@@ -157,14 +352,53 @@ class SnapTradeWrapper:
         token = UserSecret.get_token_by_user(self.user)
         data = dict(userId=self.user.email, userSecret=token)
 
-        response = self._make_request(endpoint, query_params=query_params, data=data)
+        return dict(query_params=query_params, data=data)
 
+    def _login_user_response(self, response):
         if response.status_code == 200:
             return response.json()
 
-    def account_holdings(self, accounts=None):
-        endpoint = "holdings"
+    def login_user_redirect(self):
+        endpoint = "login"
+
+        response = self._make_request(endpoint, **self._login_user_request())
+
+        return self._login_user_response(response)
+
+    def cached_login_user_redirect(self):
+        """
+        login_user_redirect served from a redirect URI prefetched by
+        prefetch_login_redirect when there is one, which is then replaced in
+        the background for the next click.
+        """
+        redirect_uri_response = pop_cached_login_redirect(self.user)
+
+        if redirect_uri_response is None:
+            return self.login_user_redirect()
+
+        self.prefetch_login_redirect()
+
+        return redirect_uri_response
+
+    def prefetch_login_redirect(self):
+        """Fetches a login redirect URI for cached_login_user_redirect on a thread, unless one is cached or coming"""
+        if not claim_login_redirect_prefetch(self.user):
+            return
 
+        def prefetch():
+            try:
+                redirect_uri_response = SnapTradeWrapper(self.user, priority=BACKGROUND).login_user_redirect()
+                if redirect_uri_response:
+                    set_cached_login_redirect(self.user, redirect_uri_response)
+            except UpstreamUnavailable:
+                pass
+            finally:
+                release_login_redirect_prefetch(self.user)
+                connection.close()
+
+        threading.Thread(target=prefetch, daemon=True).start()
+
+    def _account_holdings_request(self, accounts=None):
         partner_id = self.snaptrade_partner_id
         timestamp = round(time.time())
 
@@ -174,26 +408,571 @@ class SnapTradeWrapper:
             accounts_numbers = ",".join(accounts)
             query_params["accounts"] = accounts_numbers
 
-        response = self._make_request(endpoint, query_params=query_params, basic_auth=True)
-
-        if True:
-            if response.status_code == 200:
-                accounts_holdings = response.json()
-                for account_holdings in accounts_holdings:
-                    account_data = account_holdings.get("account")
-                    account_number = account_data.get("number")
-                    account_brokerage = account_data.get("brokerage")
-                    account_name = account_data.get("name")
-
-                    account = Account.objects.filter(
-                        user=self.user, number=account_number, brokerage=account_brokerage
-                    ).first()
-
-                    if not account:
-                        Account.objects.create(
-                            user=self.user, number=account_number, brokerage=account_brokerage, description=account_name
-                        )
-            else:
-                return []
+        return dict(query_params=query_params, basic_auth=True)
+
+    def _account_holdings_response(self, response):
+        if response.status_code != 200:
+            return []
+
+        accounts_holdings = response.json()
+
+        self._save_holdings(accounts_holdings)
+
+        return accounts_holdings
+
+    def _save_holdings(self, accounts_holdings):
+        # The holdings were fetched all the same, a failed write must not fail the page or the sync
+        try:
+            store_holdings(self.user, accounts_holdings)
+        except DatabaseError:
+            logger.exception("Storing the holdings of user %s failed", self.user.pk)
+
+    def account_holdings(self, accounts=None):
+        return self.fetch_account_holdings(accounts)[1]
+
+    def fetch_account_holdings(self, accounts=None):
+        """
+        Live holdings along with whether upstream answered, so a failure is
+        not taken for an empty portfolio. Concurrent calls for the same user
+        and accounts share a single request and the same result objects.
+        """
+        key = holdings_flight_key(self.user, accounts)
+
+        return holdings_flights.do(key, partial(self._fetch_account_holdings, accounts))
+
+    def _fetch_account_holdings(self, accounts=None):
+        endpoint = "holdings"
+
+        response = self._make_request(endpoint, **self._account_holdings_request(accounts))
 
+        return response.status_code == 200, self._account_holdings_response(response)
+
+    def _refresh_cached_holdings(self, accounts=None):
+        ok, accounts_holdings = self.fetch_account_holdings(accounts)
+
+        if ok:
+            set_cached_holdings(self.user, accounts_holdings, accounts)
+
+        return accounts_holdings
+
+    def _refresh_cached_holdings_in_background(self, accounts=None):
+        def refresh():
+            try:
+                SnapTradeWrapper(self.user, priority=BACKGROUND)._refresh_cached_holdings(accounts)
+            except UpstreamUnavailable:
+                pass
+            finally:
+                release_holdings_refresh(self.user, accounts)
+                connection.close()
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def _fallback_holdings(self, accounts=None):
+        """Last synced holdings of the user whatever their age, None when there are none"""
+        accounts_holdings = HoldingsSnapshot.last_payload(self.user)
+
+        if accounts_holdings is None or not accounts:
             return accounts_holdings
+
+        return [holdings for holdings in accounts_holdings if (holdings.get("account") or {}).get("number") in accounts]
+
+    def cached_account_holdings(self, accounts=None):
+        """
+        account_holdings served from the holdings cache. Stale entries are
+        returned as is while a single background refresh replaces them, and
+        the last synced holdings stand in while upstream is unavailable.
+        """
+        accounts_holdings, is_stale = get_cached_holdings(self.user, accounts)
+
+        if accounts_holdings is None:
+            try:
+                return self._refresh_cached_holdings(accounts)
+            except UpstreamUnavailable:
+                accounts_holdings = self._fallback_holdings(accounts)
+                if accounts_holdings is None:
+                    raise
+                return accounts_holdings
+
+        if is_stale and claim_holdings_refresh(self.user, accounts):
+            self._refresh_cached_holdings_in_background(accounts)
+
+        return accounts_holdings
+
+    def synced_account_holdings(self):
+        """Holdings stored by the sync worker, or cached live holdings when the user has no recent snapshot"""
+        accounts_holdings = HoldingsSnapshot.fresh_payload(self.user, getattr(settings, "SNAPTRADE_SYNC_MAX_AGE", 900))
+
+        if accounts_holdings is None:
+            return self.cached_account_holdings()
+
+        return accounts_holdings
+
+    def exchange_rates(self):
+        """The FX rate matrix, fetched once per SNAPTRADE_FX_RATES_TTL for every user, None when unavailable"""
+        rates = get_cached_rates()
+
+        if rates is None:
+            response = self.call("get_currencies_rates")
+
+            if response.status_code != 200:
+                return None
+
+            rates = RateMatrix.from_pairs(response.json())
+            set_cached_rates(rates)
+
+        return rates
+
+    def valuation(self, accounts_holdings, base=None):
+        """accounts_holdings valued in base (SNAPTRADE_BASE_CURRENCY by default), None without FX rates"""
+        try:
+            rates = self.exchange_rates()
+        except UpstreamUnavailable:
+            return None
+
+        if rates is None:
+            return None
+
+        return Valuation(Portfolio.from_holdings(accounts_holdings), rates, base or settings.SNAPTRADE_BASE_CURRENCY)
+
+    def stream_account_holdings(self, max_workers=None):
+        """
+        synced_account_holdings one account at a time. Without synced or cached
+        holdings every account is yielded as soon as its own fan-out calls
+        complete, and the whole lot is stored and cached once all are in.
+        Accounts with a failed call are skipped, and once the others are
+        stored UpstreamUnavailable is raised instead of caching them.
+        """
+        accounts_holdings = HoldingsSnapshot.fresh_payload(self.user, getattr(settings, "SNAPTRADE_SYNC_MAX_AGE", 900))
+
+        if accounts_holdings is None and get_cached_holdings(self.user)[0] is not None:
+            accounts_holdings = self.cached_account_holdings()
+
+        if accounts_holdings is not None:
+            yield from accounts_holdings
+            return
+
+        if max_workers is None:
+            max_workers = getattr(settings, "SNAPTRADE_FANOUT_MAX_WORKERS", 8)
+
+        try:
+            token = UserSecret.get_token_by_user(self.user)
+            user_accounts = self._fan_out_accounts(
+                self._make_request("accounts", **self._user_request("accounts", token))
+            )
+        except UpstreamUnavailable:
+            accounts_holdings = self._fallback_holdings()
+            if accounts_holdings is None:
+                raise
+            yield from accounts_holdings
+            return
+
+        calls = self._fan_out_calls(user_accounts)
+
+        if not calls:
+            return
+
+        account_calls = {}
+        for index, (account, _, _) in enumerate(calls):
+            account_calls.setdefault(account["id"], []).append(index)
+
+        results = [None] * len(calls)
+        remaining = {account_id: len(indexes) for account_id, indexes in account_calls.items()}
+        streamed = []
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(calls))) as executor:
+            futures = {
+                executor.submit(self._fetch_account_resource, endpoint_name, token, account["id"]): index
+                for index, (account, _, endpoint_name) in enumerate(calls)
+            }
+
+            for future in as_completed(futures):
+                index = futures[future]
+                results[index] = future.result()
+
+                account_id = calls[index][0]["id"]
+                remaining[account_id] -= 1
+                if remaining[account_id]:
+                    continue
+
+                indexes = account_calls[account_id]
+                merged = self._merge_fan_out(
+                    [calls[call_index] for call_index in indexes], [results[call_index] for call_index in indexes]
+                )
+
+                # An account with a failed call is left out rather than shown, stored and cached as empty
+                if merged:
+                    streamed.append(merged[0])
+                    yield merged[0]
+
+        self._save_holdings(streamed)
+
+        if len(streamed) < len(account_calls):
+            raise UpstreamUnavailable(
+                "%d of %d accounts failed" % (len(account_calls) - len(streamed), len(account_calls))
+            )
+
+        set_cached_holdings(self.user, streamed)
+
+    def _user_request(self, endpoint_name, token, account_id=None):
+        """Request kwargs of a per-user endpoint, with the query params docs/api.yaml requires of it"""
+        query_params = self._call_query_params(endpoint_name, token=token)
+
+        if account_id is None:
+            return dict(query_params=query_params)
+
+        return dict(query_params=query_params, path_params=dict(accountId=account_id))
+
+    def _list_response(self, response):
+        if response.status_code == 200:
+            return response.json()
+
+        return []
+
+    def _fan_out_accounts(self, response):
+        """The accounts listed by an accounts response, raises UpstreamUnavailable when it failed"""
+        if response.status_code != 200:
+            raise UpstreamUnavailable("accounts failed with status %s" % response.status_code)
+
+        return response.json()
+
+    def _resource_response(self, response):
+        """A per-account fan-out result, None when the call failed"""
+        if response.status_code != 200:
+            return None
+
+        return response.json()
+
+    def _fan_out_calls(self, user_accounts, accounts=None, include_orders=False):
+        """Returns the (account, resource, endpoint name) triples the fan-out path has to fetch"""
+        if accounts:
+            user_accounts = [account for account in user_accounts if account.get("number") in accounts]
+
+        resources = ["balances", "positions"]
+        if include_orders:
+            resources.append("orders")
+
+        return [
+            (account, resource, self.account_resources[resource]) for account in user_accounts for resource in resources
+        ]
+
+    def _merge_fan_out(self, calls, results):
+        """
+        Merges per-account results into the list shape returned by
+        account_holdings. Accounts with a failed call, a None result, are
+        left out so they are never taken for empty ones.
+        """
+        failed = {account["id"] for (account, _, _), result in zip(calls, results) if result is None}
+
+        accounts_holdings = {}
+
+        for (account, resource, _), result in zip(calls, results):
+            if account["id"] in failed:
+                continue
+
+            account_holdings = accounts_holdings.get(account["id"])
+
+            if account_holdings is None:
+                account_holdings = accounts_holdings[account["id"]] = dict(
+                    account=dict(
+                        id=account.get("id"),
+                        brokerage=account.get("institution_name"),
+                        number=account.get("number"),
+                        name=account.get("name"),
+                    )
+                )
+
+            account_holdings[resource] = result
+
+        return list(accounts_holdings.values())
+
+    def _fetch_account_resource(self, endpoint_name, token, account_id):
+        request_kwargs = self._user_request(endpoint_name, token, account_id=account_id)
+
+        try:
+            with host_slot(self.base_url):
+                response = self._make_request(endpoint_name, **request_kwargs)
+        except UpstreamUnavailable:
+            return None
+
+        return self._resource_response(response)
+
+    def list_accounts(self):
+        endpoint = "accounts"
+
+        token = UserSecret.get_token_by_user(self.user)
+
+        response = self._make_request(endpoint, **self._user_request(endpoint, token))
+
+        return self._list_response(response)
+
+    def account_holdings_concurrent(self, accounts=None, include_orders=False, max_workers=None):
+        """
+        Same result shape as account_holdings, built from concurrent per-account
+        balances/positions (and optionally orders) calls. Pass account numbers to
+        refresh only those accounts. Accounts with a failed call are left out and
+        keep their stored holdings, UpstreamUnavailable is raised when every
+        account failed.
+        """
+        if max_workers is None:
+            max_workers = getattr(settings, "SNAPTRADE_FANOUT_MAX_WORKERS", 8)
+
+        token = UserSecret.get_token_by_user(self.user)
+
+        user_accounts = self._fan_out_accounts(self._make_request("accounts", **self._user_request("accounts", token)))
+
+        calls = self._fan_out_calls(user_accounts, accounts, include_orders)
+
+        if not calls:
+            return []
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(calls))) as executor:
+            futures = [
+                executor.submit(self._fetch_account_resource, endpoint_name, token, account["id"])
+                for account, _, endpoint_name in calls
+            ]
+            results = [future.result() for future in futures]
+
+        return self._fan_out_holdings(calls, results)
+
+    def _fan_out_holdings(self, calls, results):
+        accounts_holdings = self._merge_fan_out(calls, results)
+
+        if not accounts_holdings:
+            raise UpstreamUnavailable("every account failed")
+
+        self._save_holdings(accounts_holdings)
+
+        return accounts_holdings
+
+
+class AsyncSnapTradeWrapper(SnapTradeWrapper):
+    """SnapTradeWrapper counterpart for async views, upstream calls never block a worker thread"""
+
+    async def _acquire_token(self, endpoint_name):
+        # Waiting for a token blocks, so only a call that has to queue is handed to a thread
+        scheduler = get_scheduler()
+
+        if not scheduler.try_acquire(self.snaptrade_partner_id, endpoint_name, self.priority):
+            acquire = partial(scheduler.acquire, self.snaptrade_partner_id, endpoint_name, self.priority)
+            await asyncio.get_running_loop().run_in_executor(None, acquire, self._rate_limit_max_wait())
+
+    async def _send(self, method, endpoint, headers, data):
+        client = get_async_client()
+        timeout = getattr(settings, "SNAPTRADE_TIMEOUT", 10)
+
+        if client is None:
+            # A loop that only lives for this request goes through the process-wide session, on a thread
+            request = sync_to_async(get_session().request, thread_sensitive=False)
+            response = await request(method, endpoint, headers=headers, json=data, timeout=timeout)
+        else:
+            response = await client.request(method, endpoint, headers=headers, json=data, timeout=timeout)
+
+        self._record_rate_limit(response)
+
+        return response
+
+    async def _make_request(self, endpoint_name, data=None, path_params=None, query_params=None, basic_auth=False):
+        method, endpoint, headers = self._prepare_request(endpoint_name, data, path_params, query_params)
+
+        # Send the exact query string that was signed
+        if query_params:
+            endpoint = "%s?%s" % (endpoint, urlencode(query_params))
+
+        send = partial(self._send, method, endpoint, headers, data)
+        hedge_after = self._hedge_after(endpoint_name, method)
+        breaker = get_breaker(endpoint_name)
+        policy = RetryPolicy.from_settings()
+
+        breaker_key = self._breaker_key(query_params)
+
+        breaker.before_call()
+
+        for attempt in itertools.count():
+            await self._acquire_token(endpoint_name)
+
+            try:
+                if hedge_after is None:
+                    response = await send()
+                else:
+                    response = await hedged_async(send, hedge_after, partial(self._hedge_allowed, endpoint_name))
+            except (httpx.TransportError, requests.ConnectionError, requests.Timeout) as error:
+                delay = policy.retry_delay(method, attempt)
+                if delay is None:
+                    breaker.record(key=breaker_key)
+                    raise UpstreamUnavailable("%s failed: %s" % (endpoint_name, error)) from error
+            else:
+                delay = policy.retry_delay(method, attempt, response.status_code)
+                if delay is None:
+                    breaker.record(response.status_code, breaker_key)
+                    return response
+
+            await asyncio.sleep(delay)
+
+    async def register_user(self):
+        endpoint = "register"
+
+        response = await self._make_request(endpoint, **self._register_user_request())
+
+        await sync_to_async(self._register_user_response)(response)
+
+    async def delete_user(self):
+        endpoint = "delete_user"
+
+        user_secret_obj, request_kwargs = await sync_to_async(self._delete_user_request)()
+
+        if user_secret_obj:
+            response = await self._make_request(endpoint, **request_kwargs)
+            await sync_to_async(self._delete_user_response)(user_secret_obj, response)
+
+    async def login_user_redirect(self):
+        endpoint = "login"
+
+        request_kwargs = await sync_to_async(self._login_user_request)()
+
+        response = await self._make_request(endpoint, **request_kwargs)
+
+        return self._login_user_response(response)
+
+    async def cached_login_user_redirect(self):
+        redirect_uri_response = await sync_to_async(pop_cached_login_redirect)(self.user)
+
+        if redirect_uri_response is None:
+            return await self.login_user_redirect()
+
+        await self.prefetch_login_redirect()
+
+        return redirect_uri_response
+
+    async def prefetch_login_redirect(self):
+        await sync_to_async(SnapTradeWrapper.prefetch_login_redirect)(self)
+
+    async def call(self, endpoint_name, data=None, path_params=None, query_params=None):
+        token = None
+        if "userSecret" in self.endpoints[endpoint_name].get("required_query_params", ()):
+            token = await sync_to_async(UserSecret.get_token_by_user)(self.user)
+
+        query_params = self._call_query_params(endpoint_name, query_params, token)
+
+        return await self._make_request(endpoint_name, data=data, path_params=path_params, query_params=query_params)
+
+    async def account_holdings(self, accounts=None):
+        return (await self.fetch_account_holdings(accounts))[1]
+
+    async def fetch_account_holdings(self, accounts=None):
+        key = holdings_flight_key(self.user, accounts)
+
+        return await holdings_flights.do_async(key, partial(self._fetch_account_holdings, accounts))
+
+    async def _fetch_account_holdings(self, accounts=None):
+        endpoint = "holdings"
+
+        response = await self._make_request(endpoint, **self._account_holdings_request(accounts))
+
+        return response.status_code == 200, await sync_to_async(self._account_holdings_response)(response)
+
+    async def _refresh_cached_holdings(self, accounts=None):
+        ok, accounts_holdings = await self.fetch_account_holdings(accounts)
+
+        if ok:
+            await sync_to_async(set_cached_holdings)(self.user, accounts_holdings, accounts)
+
+        return accounts_holdings
+
+    async def cached_account_holdings(self, accounts=None):
+        accounts_holdings, is_stale = await sync_to_async(get_cached_holdings)(self.user, accounts)
+
+        if accounts_holdings is None:
+            try:
+                return await self._refresh_cached_holdings(accounts)
+            except UpstreamUnavailable:
+                accounts_holdings = await sync_to_async(self._fallback_holdings)(accounts)
+                if accounts_holdings is None:
+                    raise
+                return accounts_holdings
+
+        # The refresh runs on a thread, an event loop task would die with the loop of a WSGI request
+        if is_stale and await sync_to_async(claim_holdings_refresh)(self.user, accounts):
+            self._refresh_cached_holdings_in_background(accounts)
+
+        return accounts_holdings
+
+    async def synced_account_holdings(self):
+        accounts_holdings = await sync_to_async(HoldingsSnapshot.fresh_payload)(
+            self.user, getattr(settings, "SNAPTRADE_SYNC_MAX_AGE", 900)
+        )
+
+        if accounts_holdings is None:
+            return await self.cached_account_holdings()
+
+        return accounts_holdings
+
+    async def exchange_rates(self):
+        rates = await sync_to_async(get_cached_rates)()
+
+        if rates is None:
+            response = await self.call("get_currencies_rates")
+
+            if response.status_code != 200:
+                return None
+
+            rates = RateMatrix.from_pairs(response.json())
+            await sync_to_async(set_cached_rates)(rates)
+
+        return rates
+
+    async def valuation(self, accounts_holdings, base=None):
+        try:
+            rates = await self.exchange_rates()
+        except UpstreamUnavailable:
+            return None
+
+        if rates is None:
+            return None
+
+        return Valuation(Portfolio.from_holdings(accounts_holdings), rates, base or settings.SNAPTRADE_BASE_CURRENCY)
+
+    async def _fetch_account_resource(self, endpoint_name, token, account_id, semaphore):
+        request_kwargs = self._user_request(endpoint_name, token, account_id=account_id)
+
+        try:
+            async with semaphore, async_host_slot(self.base_url):
+                response = await self._make_request(endpoint_name, **request_kwargs)
+        except UpstreamUnavailable:
+            return None
+
+        return self._resource_response(response)
+
+    async def list_accounts(self):
+        endpoint = "accounts"
+
+        token = await sync_to_async(UserSecret.get_token_by_user)(self.user)
+
+        response = await self._make_request(endpoint, **self._user_request(endpoint, token))
+
+        return self._list_response(response)
+
+    async def account_holdings_concurrent(self, accounts=None, include_orders=False, max_workers=None):
+        if max_workers is None:
+            max_workers = getattr(settings, "SNAPTRADE_FANOUT_MAX_WORKERS", 8)
+
+        token = await sync_to_async(UserSecret.get_token_by_user)(self.user)
+
+        user_accounts = self._fan_out_accounts(
+            await self._make_request("accounts", **self._user_request("accounts", token))
+        )
+
+        calls = self._fan_out_calls(user_accounts, accounts, include_orders)
+
+        if not calls:
+            return []
+
+        semaphore = asyncio.Semaphore(max_workers)
+
+        results = await asyncio.gather(
+            *(
+                self._fetch_account_resource(endpoint_name, token, account["id"], semaphore)
+                for account, _, endpoint_name in calls
+            )
+        )
+
+        return await sync_to_async(self._fan_out_holdings)(calls, results)
@@ -0,0 +1,136 @@
+import os
+import random
+import tempfile
+import time
+
+from chipmunk.models import Account, UserManager, UserSecret
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+# Last migration without the Account and UserSecret indexes
+UNINDEXED_MIGRATION = "0003_account"
+
+BROKERAGES = ("Questrade", "Wealthsimple", "Interactive Brokers", "Alpaca")
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks Account and UserSecret lookups on a throwaway database filled with --accounts accounts, "
+        "before and after the migrations adding their indexes, and shows the query plans"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--accounts", type=int, default=1000000)
+        parser.add_argument("--users", type=int, default=10000)
+        parser.add_argument("--lookups", type=int, default=2000, help="Timed lookups per case")
+        parser.add_argument("--batch-size", type=int, default=10000, help="Rows per INSERT while filling the tables")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        test_db_dir = None
+        if connection.vendor == "sqlite":
+            test_db_dir = tempfile.mkdtemp()
+            connection.settings_dict["TEST"]["NAME"] = os.path.join(test_db_dir, "bench.sqlite3")
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+
+        try:
+            call_command("migrate", "chipmunk", UNINDEXED_MIGRATION, verbosity=0)
+
+            started = time.perf_counter()
+            keys = self.fill(options)
+            self.stdout.write("Filled %d accounts in %.1fs" % (options["accounts"], time.perf_counter() - started))
+
+            before = self.measure(keys, options)
+
+            started = time.perf_counter()
+            call_command("migrate", "chipmunk", verbosity=0)
+            self.stdout.write("Migrated in %.1fs" % (time.perf_counter() - started))
+
+            after = self.measure(keys, options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            if test_db_dir:
+                os.rmdir(test_db_dir)
+
+        self.report(before, after)
+
+    def fill(self, options):
+        """Creates the users, one UserSecret each and the accounts spread over them, returns the account keys"""
+        rng = random.Random(options["seed"])
+        batch_size = options["batch_size"]
+
+        UserManager.objects.bulk_create(
+            [
+                UserManager(username="bench-%d@example.com" % index, email="bench-%d@example.com" % index)
+                for index in range(options["users"])
+            ],
+            batch_size=batch_size,
+        )
+        user_ids = list(UserManager.objects.order_by("id").values_list("id", flat=True))
+
+        UserSecret.objects.bulk_create(
+            [UserSecret(user_id=user_id, token="SECRET-%d" % user_id) for user_id in user_ids], batch_size=batch_size
+        )
+
+        keys = []
+
+        for start in range(0, options["accounts"], batch_size):
+            accounts = []
+
+            for index in range(start, min(start + batch_size, options["accounts"])):
+                key = (rng.choice(user_ids), "%08d" % index, rng.choice(BROKERAGES))
+                keys.append(key)
+                accounts.append(Account(user_id=key[0], number=key[1], brokerage=key[2], description="Account"))
+
+            Account.objects.bulk_create(accounts)
+
+        return keys
+
+    def cases(self):
+        """{case: function of an account key returning the queryset looked up}"""
+        return {
+            "account by (user, number, brokerage)": lambda key: Account.objects.filter(
+                user_id=key[0], number=key[1], brokerage=key[2]
+            ),
+            "accounts of a user": lambda key: Account.objects.filter(user_id=key[0]),
+            "user secret of a user": lambda key: UserSecret.objects.filter(user_id=key[0]).values_list("token"),
+        }
+
+    def measure(self, keys, options):
+        rng = random.Random(options["seed"])
+        sample = [rng.choice(keys) for _ in range(options["lookups"])]
+
+        results = {}
+
+        for name, queryset_of in self.cases().items():
+            # An untimed pass first, so both runs read the same pages from a warm cache
+            for key in sample:
+                list(queryset_of(key))
+
+            started = time.perf_counter()
+            for key in sample:
+                list(queryset_of(key))
+            elapsed = time.perf_counter() - started
+
+            results[name] = dict(us_per_lookup=elapsed / len(sample) * 1000000, plan=queryset_of(sample[0]).explain())
+
+        return results
+
+    def report(self, before, after):
+        width = max(len(name) for name in before)
+
+        self.stdout.write("%s  %14s  %14s" % ("case".ljust(width), "before us/op", "after us/op"))
+        for name in before:
+            self.stdout.write(
+                "%s  %14.1f  %14.1f" % (name.ljust(width), before[name]["us_per_lookup"], after[name]["us_per_lookup"])
+            )
+
+        for name in before:
+            self.stdout.write("\n%s" % name)
+            self.stdout.write("  before: %s" % before[name]["plan"].replace("\n", "\n          "))
+            self.stdout.write("  after:  %s" % after[name]["plan"].replace("\n", "\n          "))
@@ -0,0 +1,157 @@
+import hmac
+import json
+import random
+import timeit
+import tracemalloc
+from base64 import b64encode
+from hashlib import sha256
+from urllib.parse import urlencode
+
+from chipmunk.integrations import SnapTradeWrapper
+from chipmunk.signing import Signer
+from django.core.management.base import BaseCommand, CommandError
+
+REQUEST_PATH = "/api/v1/snapTrade/holdings"
+
+
+def reference_sign(consumer_key, request_data, request_path, request_query):
+    """The algorithm from the API docs and the getting-started tutorial, kept as the baseline"""
+    sig_object = {"content": request_data, "path": request_path, "query": request_query}
+
+    sig_content = json.dumps(sig_object, separators=(",", ":"), sort_keys=True)
+    sig_digest = hmac.new(consumer_key, sig_content.encode(), sha256).digest()
+
+    return b64encode(sig_digest).decode()
+
+
+def request_bodies(rng):
+    small = dict(userId="api@passiv.com", userSecret="CHRIS.P.BACON")
+
+    large = dict(
+        userId="api@passiv.com",
+        trades=[
+            dict(
+                account_id="%08d" % rng.randrange(10 ** 8),
+                universal_symbol_id="%08x" % rng.randrange(16 ** 8),
+                action=rng.choice(["BUY", "SELL"]),
+                order_type="Limit",
+                time_in_force="Day",
+                units=rng.randrange(1, 1000),
+                price=round(rng.uniform(1, 500), 2),
+            )
+            for _ in range(250)
+        ],
+    )
+
+    return dict(none=None, small=small, large=large)
+
+
+def request_queries(rng):
+    queries = {}
+
+    for name, extra_params in (("short", 0), ("medium", 8), ("long", 64)):
+        query = dict(partnerId="PASSIVTEST", timestamp=1635790389, userId="api@passiv.com")
+        for index in range(extra_params):
+            query["param%d" % index] = "%016x" % rng.randrange(16 ** 16)
+        queries[name] = query
+
+    return queries
+
+
+class Command(BaseCommand):
+    help = "Benchmarks request signing (wrapper, Signer and the reference algorithm) and checks for regressions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5, help="Timing runs per case, the best one is reported")
+        parser.add_argument("--batch", type=int, default=100, help="Requests per sign_many() call")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--save", help="Write the results to this JSON file")
+        parser.add_argument("--baseline", help="JSON file written by --save to compare against")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.25,
+            help="Fail when a case is slower than the baseline by more than this fraction",
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        consumer_key = b"YOUR_CONSUMER_KEY"
+
+        wrapper = SnapTradeWrapper(None)
+        wrapper.snaptrade_consumer_key = consumer_key
+        wrapper.signer = Signer(consumer_key)
+        signer = Signer(consumer_key)
+
+        results = {}
+
+        for body_name, body in request_bodies(rng).items():
+            for query_name, query in request_queries(rng).items():
+                query_string = urlencode(query)
+                batch = [(body, REQUEST_PATH, query_string)] * options["batch"]
+
+                cases = {
+                    "reference": (lambda: reference_sign(consumer_key, body, REQUEST_PATH, query_string), 1),
+                    "wrapper.sign_request": (lambda: wrapper.sign_request(body, REQUEST_PATH, query_string), 1),
+                    "wrapper.get_signature": (lambda: wrapper.get_signature(body, REQUEST_PATH, query), 1),
+                    "signer.sign cold": (lambda: Signer(consumer_key).sign(body, REQUEST_PATH, query_string), 1),
+                    "signer.sign warm": (lambda: signer.sign(body, REQUEST_PATH, query_string), 1),
+                    "signer.sign_many": (lambda: signer.sign_many(batch), len(batch)),
+                }
+
+                for case_name, (func, ops_per_call) in cases.items():
+                    name = "%s body=%s query=%s" % (case_name, body_name, query_name)
+                    results[name] = self.measure(func, ops_per_call, options["repeat"])
+
+        self.report(results)
+
+        if options["save"]:
+            with open(options["save"], "w") as results_file:
+                json.dump(results, results_file, indent=2, sort_keys=True)
+
+        if options["baseline"]:
+            self.check_regressions(results, options["baseline"], options["threshold"])
+
+    def measure(self, func, ops_per_call, repeat):
+        timer = timeit.Timer(func)
+
+        # Calls per run are picked so every run takes at least 0.2s, whatever the payload size
+        calls, _ = timer.autorange()
+        best = min(timer.repeat(repeat=repeat, number=calls))
+
+        tracemalloc.start()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return dict(ops_per_sec=round(calls * ops_per_call / best), peak_bytes_per_op=peak // ops_per_call)
+
+    def report(self, results):
+        width = max(len(name) for name in results)
+
+        self.stdout.write("%s  %12s  %12s" % ("case".ljust(width), "ops/sec", "peak B/op"))
+        for name, result in results.items():
+            self.stdout.write(
+                "%s  %12d  %12d" % (name.ljust(width), result["ops_per_sec"], result["peak_bytes_per_op"])
+            )
+
+    def check_regressions(self, results, baseline_path, threshold):
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        regressions = []
+
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+
+            floor = baseline[name]["ops_per_sec"] * (1 - threshold)
+            if result["ops_per_sec"] < floor:
+                regressions.append(
+                    "%s: %d ops/sec, baseline %d" % (name, result["ops_per_sec"], baseline[name]["ops_per_sec"])
+                )
+
+        if regressions:
+            raise CommandError("Signing regressions over %d%%:\n%s" % (threshold * 100, "\n".join(regressions)))
+
+        self.stdout.write(self.style.SUCCESS("No regressions against %s" % baseline_path))
@@ -0,0 +1,113 @@
+import random
+import timeit
+
+from chipmunk.portfolio import Portfolio
+from chipmunk.valuation import RateMatrix, Valuation
+from chipmunk.view_models import holdings_view_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.template.loader import get_template
+from django.test import RequestFactory
+from django_jinja.backend import Jinja2
+
+CURRENCIES = ("CAD", "USD", "EUR")
+
+TEMPLATES = dict(django="home.html", jinja="home.jinja")
+
+
+def accounts_holdings(rng, positions, per_account):
+    """An account_holdings payload with positions spread over accounts of at most per_account positions"""
+    payload = []
+
+    for start in range(0, positions, per_account):
+        payload.append(
+            dict(
+                account=dict(number="%08d" % start, institution_name="Questrade", name="Account %d" % start),
+                positions=[
+                    dict(
+                        symbol=dict(symbol=dict(symbol="SYM%05d" % index, currency=dict(code=rng.choice(CURRENCIES)))),
+                        units=rng.randrange(1, 1000),
+                        price=round(rng.uniform(1, 500), 2),
+                    )
+                    for index in range(start, min(start + per_account, positions))
+                ],
+                balances=[dict(currency=dict(code=code), cash=round(rng.uniform(0, 10000), 2)) for code in CURRENCIES],
+            )
+        )
+
+    return payload
+
+
+def rates():
+    def pair(src, dst, rate):
+        return dict(src=dict(code=src), dst=dict(code=dst), exchange_rate=rate)
+
+    return RateMatrix.from_pairs([pair("USD", "CAD", 1.25), pair("EUR", "CAD", 1.45)])
+
+
+class Command(BaseCommand):
+    help = "Benchmarks rendering the holdings dashboard with the Django and Jinja2 templates"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="Positions per render")
+        parser.add_argument("--per-account", type=int, default=25, help="Positions per account")
+        parser.add_argument("--repeat", type=int, default=5, help="Timing runs per case, the best one is reported")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+
+        request = RequestFactory().get("/chipmunk/home/")
+        request.user = AnonymousUser()
+
+        templates = {engine: get_template(name) for engine, name in TEMPLATES.items()}
+
+        results = {}
+
+        for size in options["sizes"]:
+            holdings = accounts_holdings(rng, size, options["per_account"])
+            valuation = Valuation(Portfolio.from_holdings(holdings), rates(), "CAD")
+
+            # The view model is built by the view either way, it is timed on its own
+            results["view model positions=%d" % size] = self.measure(
+                lambda: holdings_view_model(holdings, valuation), options["repeat"]
+            )
+
+            context = dict(holdings=holdings, valuation=valuation, groups=holdings_view_model(holdings, valuation))
+
+            for engine, template in templates.items():
+                results["%s render positions=%d" % (engine, size)] = self.measure(
+                    lambda: template.render(context, request), options["repeat"]
+                )
+
+        env = Jinja2.get_default().env
+        name = TEMPLATES["jinja"]
+
+        def load(bytecode_cache):
+            saved, env.bytecode_cache = env.bytecode_cache, bytecode_cache
+            try:
+                env.cache.clear()
+                env.get_template(name)
+            finally:
+                env.bytecode_cache = saved
+
+        results["jinja load compiled"] = self.measure(lambda: load(None), options["repeat"])
+        if env.bytecode_cache is not None:
+            results["jinja load bytecode cache"] = self.measure(lambda: load(env.bytecode_cache), options["repeat"])
+
+        self.report(results)
+
+    def measure(self, func, repeat):
+        timer = timeit.Timer(func)
+
+        calls, _ = timer.autorange()
+        best = min(timer.repeat(repeat=repeat, number=calls))
+
+        return best / calls * 1000
+
+    def report(self, results):
+        width = max(len(name) for name in results)
+
+        self.stdout.write("%s  %12s" % ("case".ljust(width), "ms/op"))
+        for name, ms in results.items():
+            self.stdout.write("%s  %12.3f" % (name.ljust(width), ms))
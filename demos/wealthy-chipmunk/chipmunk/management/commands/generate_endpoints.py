@@ -0,0 +1,103 @@
+import re
+from pathlib import Path
+
+import yaml
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+HTTP_METHODS = ("get", "post", "put", "patch", "delete")
+
+PATH_PARAM = re.compile(r"{([^}]+)}")
+
+HEADER = '''"""
+SnapTrade API operations compiled from docs/api.yaml.
+
+Generated by `manage.py generate_endpoints`, do not edit by hand.
+
+Each operation lists its path split around the path params in "segments"
+(one more segment than path params) so building a request path is a join.
+"""
+'''
+
+
+def snake_case(name):
+    return re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower()
+
+
+def operation_name(method, path):
+    words = [snake_case(segment.strip("{}")) for segment in path.strip("/").split("/") if segment]
+
+    return "_".join([method] + (words or ["root"]))
+
+
+def compile_operation(method, path, path_item, operation):
+    parameters = list(path_item.get("parameters", ())) + list(operation.get("parameters", ()))
+
+    query_params = tuple(param["name"] for param in parameters if param.get("in") == "query")
+    required_query_params = tuple(
+        param["name"] for param in parameters if param.get("in") == "query" and param.get("required")
+    )
+
+    endpoint = path.lstrip("/")
+    pieces = PATH_PARAM.split(endpoint)
+
+    return {
+        "endpoint": PATH_PARAM.sub(r"%(\1)s", endpoint),
+        "method": method,
+        "path_params": tuple(pieces[1::2]),
+        "query_params": query_params,
+        "required_query_params": required_query_params,
+        "segments": tuple(pieces[::2]),
+    }
+
+
+def compile_spec(spec):
+    endpoints = {}
+
+    for path, path_item in spec["paths"].items():
+        for method in HTTP_METHODS:
+            if method in path_item:
+                endpoints[operation_name(method, path)] = compile_operation(method, path, path_item, path_item[method])
+
+    return endpoints
+
+
+def render(endpoints):
+    lines = [HEADER, "ENDPOINTS = {"]
+
+    for name, endpoint in endpoints.items():
+        lines.append("    %r: {" % name)
+        for key, value in endpoint.items():
+            line = "        %r: %r," % (key, value)
+
+            # Wrap long tuples the way black would
+            if len(line) > 120 and isinstance(value, tuple):
+                lines.append("        %r: (" % key)
+                lines.extend("            %r," % item for item in value)
+                lines.append("        ),")
+            else:
+                lines.append(line)
+        lines.append("    },")
+
+    lines.append("}")
+
+    return "\n".join(lines).replace("'", '"') + "\n"
+
+
+class Command(BaseCommand):
+    help = "Compiles docs/api.yaml into the chipmunk.endpoints operation table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--spec", default=str(Path(settings.BASE_DIR).parent.parent / "docs" / "api.yaml"))
+        parser.add_argument("--output", default=str(Path(__file__).resolve().parents[2] / "endpoints.py"))
+
+    def handle(self, *args, **options):
+        with open(options["spec"]) as spec_file:
+            spec = yaml.safe_load(spec_file)
+
+        endpoints = compile_spec(spec)
+
+        with open(options["output"], "w") as output_file:
+            output_file.write(render(endpoints))
+
+        self.stdout.write(self.style.SUCCESS("Wrote %d operations to %s" % (len(endpoints), options["output"])))
@@ -0,0 +1,178 @@
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from chipmunk.mock_api import MockSnapTradeAPI, default_spec_path, load_spec, serve_in_thread
+from chipmunk.models import UserManager, UserSecret
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext,
+    override_settings,
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+VIEWS = {
+    "home": "/chipmunk/home/",
+    "passiv_login": "/chipmunk/passiv_login/",
+    "symbol_redirect": "/chipmunk/symbol_redirect/?symbol=VAB",
+}
+
+
+def percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+
+    return sorted_values[min(len(sorted_values) - 1, round(percent / 100 * (len(sorted_values) - 1)))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Drives the chipmunk views with simulated logged-in users against the local SnapTrade stand-in, "
+        "on a throwaway test database, and reports throughput, latency, DB queries and upstream calls"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--requests", type=int, default=10, help="Requests per user")
+        parser.add_argument("--concurrency", type=int, default=8, help="Simulated users in flight at once")
+        parser.add_argument("--views", default=",".join(VIEWS), help="Comma separated subset of %s" % ", ".join(VIEWS))
+        parser.add_argument("--accounts", type=int, default=3, help="Accounts and positions per account upstream")
+        parser.add_argument("--latency", type=float, default=0.05, help="Upstream latency in seconds")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of upstream calls failing")
+        parser.add_argument("--rate-limit", type=float, default=None, help="Upstream requests per second before 429s")
+        parser.add_argument("--no-cache", action="store_true", help="Disable the holdings cache")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        views = [name.strip() for name in options["views"].split(",") if name.strip()]
+
+        api = MockSnapTradeAPI(
+            load_spec(default_spec_path(settings.BASE_DIR)),
+            settings.SNAPTRADE_PROD_CONSUMER_KEY,
+            latency=options["latency"],
+            error_rate=options["error_rate"],
+            payload_size=options["accounts"],
+            seed=options["seed"],
+            rate_limit=options["rate_limit"],
+        )
+        server, base_url = serve_in_thread(api)
+
+        overrides = dict(SNAPTRADE_BASE_URL=base_url, ALLOWED_HOSTS=["testserver"])
+        if options["no_cache"]:
+            overrides.update(SNAPTRADE_HOLDINGS_CACHE_TTL=0, SNAPTRADE_HOLDINGS_CACHE_STALE_TTL=0)
+
+        # Shared-cache in-memory SQLite locks whole tables, a file behaves like the real database
+        test_db_dir = None
+        if connection.vendor == "sqlite":
+            test_db_dir = tempfile.mkdtemp()
+            connection.settings_dict["TEST"]["NAME"] = os.path.join(test_db_dir, "loadtest.sqlite3")
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+
+        try:
+            with override_settings(**overrides):
+                users = self.create_users(options["users"])
+                api.calls.clear()
+                results, elapsed = self.run(users, views, options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            server.shutdown()
+            server.server_close()
+            if test_db_dir:
+                os.rmdir(test_db_dir)
+
+        self.report(results, elapsed, api.calls)
+
+    def create_users(self, count):
+        users = []
+
+        for index in range(count):
+            email = "loadtest-%d@example.com" % index
+            user = UserManager.objects.create(username=email, email=email)
+            UserSecret.save_token(user, "SECRET-%d" % index)
+            users.append(user)
+
+        return users
+
+    def run(self, users, views, options):
+        results = defaultdict(list)
+        results_lock = threading.Lock()
+        rng = random.Random(options["seed"])
+
+        schedules = [(user, [rng.choice(views) for _ in range(options["requests"])]) for user in users]
+
+        def simulate(user, schedule):
+            client = Client()
+            client.force_login(user)
+
+            for view in schedule:
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    try:
+                        status = client.get(VIEWS[view]).status_code
+                    except Exception as error:
+                        status = type(error).__name__
+                    duration = time.perf_counter() - started
+
+                with results_lock:
+                    results[view].append((duration, len(queries), status))
+
+            connection.close()
+
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            for future in [executor.submit(simulate, user, schedule) for user, schedule in schedules]:
+                future.result()
+
+        return results, time.perf_counter() - started
+
+    def report(self, results, elapsed, upstream_calls):
+        total = sum(len(samples) for samples in results.values())
+
+        self.stdout.write("%d requests in %.2fs, %.1f req/s" % (total, elapsed, total / elapsed if elapsed else 0))
+        self.stdout.write("")
+        self.stdout.write(
+            "%-16s %7s %9s %9s %9s %9s %9s  %s"
+            % ("view", "count", "p50 ms", "p95 ms", "p99 ms", "queries", "max q", "statuses")
+        )
+
+        for view, samples in sorted(results.items()):
+            durations = sorted(sample[0] * 1000 for sample in samples)
+            queries = [sample[1] for sample in samples]
+            statuses = Counter(sample[2] for sample in samples)
+
+            self.stdout.write(
+                "%-16s %7d %9.1f %9.1f %9.1f %9.1f %9d  %s"
+                % (
+                    view,
+                    len(samples),
+                    percentile(durations, 50),
+                    percentile(durations, 95),
+                    percentile(durations, 99),
+                    sum(queries) / len(queries),
+                    max(queries),
+                    dict(statuses),
+                )
+            )
+
+        upstream_total = sum(upstream_calls.values())
+
+        self.stdout.write("")
+        self.stdout.write(
+            "%d upstream calls, %.2f per request" % (upstream_total, upstream_total / total if total else 0)
+        )
+        for operation, count in upstream_calls.most_common():
+            self.stdout.write("  %-40s %d" % (operation, count))
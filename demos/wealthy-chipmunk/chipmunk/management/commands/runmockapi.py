@@ -0,0 +1,47 @@
+from chipmunk.mock_api import MockSnapTradeAPI, default_spec_path, load_spec, make_server
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Serves a local stand-in of the SnapTrade API generated from docs/api.yaml. "
+        "Point the app at it with SNAPTRADE_BASE_URL = 'http://127.0.0.1:8001/api/v1/'"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("addrport", nargs="?", default="127.0.0.1:8001")
+        parser.add_argument("--spec", default=str(default_spec_path(settings.BASE_DIR)))
+        parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+        parser.add_argument("--jitter", type=float, default=0.0, help="Latency varies by up to this many seconds")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 500")
+        parser.add_argument("--rate-limit", type=float, default=None, help="Requests per second before 429s")
+        parser.add_argument("--payload-size", type=int, default=3, help="Items in every generated array")
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument("--consumer-key", default=None, help="Defaults to SNAPTRADE_PROD_CONSUMER_KEY")
+        parser.add_argument("--no-verify", action="store_true", help="Accept requests without a valid Signature")
+
+    def handle(self, *args, **options):
+        host, _, port = options["addrport"].rpartition(":")
+
+        api = MockSnapTradeAPI(
+            load_spec(options["spec"]),
+            options["consumer_key"] or settings.SNAPTRADE_PROD_CONSUMER_KEY,
+            latency=options["latency"],
+            jitter=options["jitter"],
+            error_rate=options["error_rate"],
+            payload_size=options["payload_size"],
+            seed=options["seed"],
+            rate_limit=options["rate_limit"],
+        )
+
+        server = make_server(api, host or "127.0.0.1", int(port), verify_signatures=not options["no_verify"])
+
+        self.stdout.write("Serving %d SnapTrade operations on http://%s:%s/api/v1/" % (len(api.routes), host, port))
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
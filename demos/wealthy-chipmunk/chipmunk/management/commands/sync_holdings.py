@@ -0,0 +1,33 @@
+from chipmunk.sync import HoldingsSyncWorker
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Refreshes stored holdings for every registered SnapTrade user in the background"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Sync the users that are due, then exit")
+        parser.add_argument("--interval", type=float, default=getattr(settings, "SNAPTRADE_SYNC_INTERVAL", 300))
+        parser.add_argument("--jitter", type=float, default=getattr(settings, "SNAPTRADE_SYNC_JITTER", 60))
+        parser.add_argument("--workers", type=int, default=getattr(settings, "SNAPTRADE_SYNC_WORKERS", 4))
+        parser.add_argument("--batch-size", type=int, default=100, help="Users picked up per cycle")
+        parser.add_argument("--poll", type=float, default=5, help="Seconds between cycles when nobody is due")
+
+    def handle(self, *args, **options):
+        worker = HoldingsSyncWorker(
+            interval=options["interval"],
+            jitter=options["jitter"],
+            workers=options["workers"],
+            batch_size=options["batch_size"],
+        )
+
+        if options["once"]:
+            attempted, succeeded = worker.run_once()
+            self.stdout.write("Synced holdings for %d of %d due users" % (succeeded, attempted))
+            return
+
+        try:
+            worker.run_forever(poll=options["poll"])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,36 @@
+import asyncio
+from functools import partial
+
+from chipmunk.models import UserSecret
+from django.utils.functional import SimpleLazyObject
+
+
+def attach_user_secret(user):
+    """user with user_secret set to its UserSecret token, None without one"""
+    user.user_secret = UserSecret.token_of(user) if user.is_authenticated else None
+
+    return user
+
+
+class UserSecretMiddleware:
+    """
+    Gives request.user a user_secret attribute, looked up through the user
+    secret caches when request.user is first resolved.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+        # Async below: mark the instance so Django awaits it instead of giving it a sync thread for the request
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        # Nothing is looked up here, so this is safe on the event loop, and an async get_response hands back its
+        # coroutine for the caller to await
+        request.user = SimpleLazyObject(partial(attach_user_secret, request.user))
+
+        return self.get_response(request)
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.9 on 2026-10-18 15:36
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_accounts(apps, schema_editor):
+    Account = apps.get_model("chipmunk", "Account")
+
+    duplicates = (
+        Account.objects.values("user", "number", "brokerage")
+        .annotate(keep_id=Min("id"), rows=Count("id"))
+        .filter(rows__gt=1)
+    )
+
+    for duplicate in duplicates:
+        Account.objects.filter(
+            user=duplicate["user"], number=duplicate["number"], brokerage=duplicate["brokerage"]
+        ).exclude(id=duplicate["keep_id"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chipmunk", "0003_account"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_accounts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="account",
+            constraint=models.UniqueConstraint(
+                fields=("user", "number", "brokerage"), name="chipmunk_account_unique_number"
+            ),
+        ),
+    ]
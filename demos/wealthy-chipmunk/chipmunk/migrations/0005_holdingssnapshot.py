@@ -0,0 +1,28 @@
+# Generated by Django 3.2.9 on 2026-10-18 15:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chipmunk", "0004_account_unique_number"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HoldingsSnapshot",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("payload", models.JSONField()),
+                ("fetched_at", models.DateTimeField()),
+                ("next_sync_at", models.DateTimeField(db_index=True)),
+                ("user", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="chipmunk.usermanager")),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="holdingssnapshot",
+            constraint=models.UniqueConstraint(fields=("user",), name="chipmunk_holdingssnapshot_unique_user"),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.9 on 2026-10-18 15:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chipmunk", "0005_holdingssnapshot"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Position",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("symbol", models.TextField()),
+                ("description", models.TextField()),
+                ("units", models.FloatField()),
+                ("price", models.FloatField()),
+                ("currency", models.TextField()),
+                ("synced_at", models.DateTimeField()),
+                ("account", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="chipmunk.account")),
+                ("user", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="chipmunk.usermanager")),
+            ],
+        ),
+        migrations.CreateModel(
+            name="Balance",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("currency", models.TextField()),
+                ("cash", models.FloatField()),
+                ("synced_at", models.DateTimeField()),
+                ("account", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="chipmunk.account")),
+                ("user", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="chipmunk.usermanager")),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="position",
+            constraint=models.UniqueConstraint(fields=("account", "symbol"), name="chipmunk_position_unique_symbol"),
+        ),
+        migrations.AddConstraint(
+            model_name="balance",
+            constraint=models.UniqueConstraint(fields=("account", "currency"), name="chipmunk_balance_unique_currency"),
+        ),
+    ]
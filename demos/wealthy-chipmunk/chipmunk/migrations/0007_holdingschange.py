@@ -0,0 +1,27 @@
+# Generated by Django 3.2.9 on 2026-10-18 15:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chipmunk", "0006_position_balance"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HoldingsChange",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("changes", models.JSONField()),
+                ("created_at", models.DateTimeField()),
+                ("account", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="chipmunk.account")),
+                ("user", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="chipmunk.usermanager")),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.2.9 on 2026-10-18 16:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def remove_duplicate_user_secrets(apps, schema_editor):
+    UserSecret = apps.get_model("chipmunk", "UserSecret")
+
+    # The last registration of a user is the one SnapTrade knows the secret of
+    duplicates = UserSecret.objects.values("user").annotate(keep_id=Max("id"), rows=Count("id")).filter(rows__gt=1)
+
+    for duplicate in duplicates:
+        UserSecret.objects.filter(user=duplicate["user"]).exclude(id=duplicate["keep_id"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chipmunk", "0007_holdingschange"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_user_secrets, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="usersecret",
+            name="user",
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to="chipmunk.usermanager"),
+        ),
+        migrations.AddIndex(
+            model_name="balance",
+            index=models.Index(fields=["user", "account", "currency"], name="chipmunk_balance_user_account"),
+        ),
+        migrations.AddIndex(
+            model_name="holdingschange",
+            index=models.Index(fields=["user", "id"], name="chipmunk_change_user_id"),
+        ),
+        migrations.AddIndex(
+            model_name="position",
+            index=models.Index(fields=["user", "account", "symbol"], name="chipmunk_position_user_account"),
+        ),
+    ]
@@ -0,0 +1,297 @@
+"""
+Local stand-in for the SnapTrade API, driven by docs/api.yaml.
+
+Every operation of the spec is served under /api/v1/ with synthetic data
+that follows its 2xx response schema. Request signatures are checked with
+the same algorithm as SnapTradeWrapper.sign_request, and latency, error
+rate, a partner rate limit and array sizes are configurable so the app can
+be load-tested offline.
+"""
+import hmac
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import yaml
+from chipmunk.ratelimit import TokenBucket
+from chipmunk.signing import Signer
+
+API_PREFIX = "/api/v1"
+
+HTTP_METHODS = ("get", "post", "put", "patch", "delete")
+
+# Paths the wrapper calls that the public spec files under another name
+PATH_ALIASES = {
+    "/snapTrade/holdings": "/holdings",
+}
+
+
+def load_spec(spec_path):
+    with open(spec_path) as spec_file:
+        return yaml.safe_load(spec_file)
+
+
+def default_spec_path(base_dir):
+    return Path(base_dir).parent.parent / "docs" / "api.yaml"
+
+
+class SyntheticData:
+    """Builds schema-conformant values, arrays hold payload_size items"""
+
+    max_depth = 8
+
+    def __init__(self, spec, rng, payload_size=3):
+        self.spec = spec
+        self.rng = rng
+        self.payload_size = payload_size
+
+    def resolve(self, schema):
+        while "$ref" in schema:
+            node = self.spec
+            for key in schema["$ref"].lstrip("#/").split("/"):
+                node = node[key]
+            schema = node
+
+        return schema
+
+    def generate(self, schema, depth=0):
+        schema = self.resolve(schema)
+
+        for combinator in ("oneOf", "anyOf"):
+            if combinator in schema:
+                return self.generate(schema[combinator][0], depth)
+
+        if "allOf" in schema:
+            merged = {}
+            for part in schema["allOf"]:
+                value = self.generate(part, depth)
+                if isinstance(value, dict):
+                    merged.update(value)
+            return merged
+
+        if "enum" in schema:
+            return self.rng.choice(schema["enum"])
+
+        schema_type = schema.get("type")
+
+        if schema_type == "array":
+            if depth >= self.max_depth:
+                return []
+            return [self.generate(schema.get("items", {}), depth + 1) for _ in range(self.payload_size)]
+
+        if schema_type == "object" or "properties" in schema:
+            if depth >= self.max_depth or "properties" not in schema:
+                return schema.get("example", {})
+            return {name: self.generate(prop, depth + 1) for name, prop in schema["properties"].items()}
+
+        return self.primitive(schema_type, schema)
+
+    def primitive(self, schema_type, schema):
+        example = schema.get("example")
+        schema_format = schema.get("format")
+
+        if schema_type == "integer":
+            return self.rng.randint(0, 1000) if example is None else int(example)
+
+        if schema_type == "number":
+            if isinstance(example, (int, float)) and example:
+                return round(example * self.rng.uniform(0.5, 1.5), 4)
+            return round(self.rng.uniform(0, 1000), 4)
+
+        if schema_type == "boolean":
+            return self.rng.random() < 0.5
+
+        if schema_format == "uuid":
+            return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+        if schema_format in ("date-time", "dateTime"):
+            moment = datetime(2022, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=self.rng.randrange(10 ** 7))
+            return moment.isoformat()
+
+        if example is not None:
+            return example
+
+        return "%s-%06d" % (schema_format or "string", self.rng.randrange(10 ** 6))
+
+
+class MockSnapTradeAPI:
+    def __init__(
+        self, spec, consumer_key, latency=0.0, jitter=0.0, error_rate=0.0, payload_size=3, seed=None, rate_limit=None
+    ):
+        self.spec = spec
+        self.signer = Signer(consumer_key)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.payload_size = payload_size
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.calls = Counter()
+        self.calls_lock = threading.Lock()
+        # Requests per second across every operation, answered with a 429 past it
+        self.rate_limit = TokenBucket(rate_limit, rate_limit) if rate_limit else None
+        self.rate_limit_lock = threading.Lock()
+        self.routes = self.compile_routes(spec)
+
+    @staticmethod
+    def compile_routes(spec):
+        routes = []
+
+        for path, path_item in spec["paths"].items():
+            pattern = re.compile("^%s/?$" % re.sub(r"{[^}]+}", "[^/]+", path.rstrip("/")))
+            for method in HTTP_METHODS:
+                if method in path_item:
+                    routes.append((method, pattern, path, path_item[method]))
+
+        return routes
+
+    def match(self, method, path):
+        path = PATH_ALIASES.get(path, path)
+
+        for route_method, pattern, template, operation in self.routes:
+            if route_method == method and pattern.match(path):
+                return template, operation
+
+        return None, None
+
+    def response_schema(self, operation):
+        for status, response in sorted(operation.get("responses", {}).items(), key=lambda item: str(item[0])):
+            if str(status).startswith("2"):
+                for media_type in response.get("content", {}).values():
+                    return int(status), media_type.get("schema")
+                return int(status), None
+
+        return 200, None
+
+    def handle(self, method, path):
+        """Returns (status, payload) for one request, path includes the /api/v1 prefix"""
+        if not path.startswith(API_PREFIX):
+            return 404, dict(detail="Not found", status_code=404)
+
+        template, operation = self.match(method, path[len(API_PREFIX) :] or "/")
+
+        with self.calls_lock:
+            self.calls[template] += 1
+
+        if operation is None:
+            return 404, dict(detail="Not found", status_code=404)
+
+        retry_after = self.throttle()
+        if retry_after:
+            return 429, dict(detail="Rate limit exceeded", status_code=429, retry_after=retry_after)
+
+        delay = self.latency + (self.rng.uniform(-self.jitter, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+        if self.error_rate and self.rng.random() < self.error_rate:
+            return 500, dict(detail="Injected failure", status_code=500)
+
+        return self.respond(operation)
+
+    def throttle(self):
+        """Takes a rate limit token, returns the seconds to wait when there is none"""
+        if self.rate_limit is None:
+            return 0
+
+        with self.rate_limit_lock:
+            retry_after = self.rate_limit.wait_time(time.monotonic())
+            if not retry_after:
+                self.rate_limit.take()
+
+        return retry_after
+
+    def respond(self, operation):
+        status, schema = self.response_schema(operation)
+
+        if schema is None:
+            return status, {}
+
+        with self.rng_lock:
+            data = SyntheticData(self.spec, random.Random(self.rng.getrandbits(64)), self.payload_size)
+
+        return status, data.generate(schema)
+
+    def verify(self, path, query, body, signature):
+        try:
+            content = json.loads(body) if body else None
+        except ValueError:
+            return False
+
+        return hmac.compare_digest(signature or "", self.signer.sign(content, path, query))
+
+
+class MockAPIRequestHandler(BaseHTTPRequestHandler):
+    api = None
+    verify_signatures = True
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle_method(self, method):
+        url = urlsplit(self.path)
+
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+
+        if self.verify_signatures and not self.api.verify(url.path, url.query, body, self.headers.get("Signature")):
+            return self.send_json(401, dict(detail="Invalid signature", status_code=401))
+
+        status, payload = self.api.handle(method, url.path)
+
+        self.send_json(status, payload)
+
+    def send_json(self, status, payload):
+        content = b"" if status in (204, 304) else json.dumps(payload, default=str).encode()
+
+        self.send_response(status)
+        if status == 429:
+            self.send_header("Retry-After", "%.3f" % payload["retry_after"])
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        self.handle_method("get")
+
+    def do_POST(self):
+        self.handle_method("post")
+
+    def do_PUT(self):
+        self.handle_method("put")
+
+    def do_PATCH(self):
+        self.handle_method("patch")
+
+    def do_DELETE(self):
+        self.handle_method("delete")
+
+
+def make_server(api, host="127.0.0.1", port=8001, verify_signatures=True):
+    handler = type(
+        "BoundMockAPIRequestHandler", (MockAPIRequestHandler,), dict(api=api, verify_signatures=verify_signatures)
+    )
+
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+
+    return server
+
+
+def serve_in_thread(api, host="127.0.0.1", port=0, verify_signatures=True):
+    """Starts the stand-in on a daemon thread, returns the server and the base url to give SnapTradeWrapper"""
+    server = make_server(api, host, port, verify_signatures)
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server, "http://%s:%d%s/" % (host, server.server_address[1], API_PREFIX)
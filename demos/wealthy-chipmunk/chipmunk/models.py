@@ -1,5 +1,11 @@
+from datetime import timedelta
+
+from chipmunk.caching import get_cached_user_secret, invalidate_user_secret, set_cached_user_secret
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
 
 
 # Create your models here.
@@ -16,18 +22,201 @@ class UserManagerMixin(models.Model):
 
 
 class UserSecret(UserManagerMixin):
+    user = models.OneToOneField(UserManager, on_delete=models.CASCADE)
     token = models.TextField()
 
     @classmethod
     def save_token(cls, user, token):
-        cls.objects.create(user=user, token=token)
+        # A user registered again gets a new secret, the old one is replaced
+        cls.objects.update_or_create(user=user, defaults=dict(token=token))
 
     @classmethod
     def get_token_by_user(cls, user):
-        return cls.objects.get(user=user).token
+        token = cls.token_of(user)
+
+        if token is None:
+            raise cls.DoesNotExist("UserSecret matching query does not exist.")
+
+        return token
+
+    @classmethod
+    def token_of(cls, user):
+        """Token of user read through the user secret caches, None when the user has no UserSecret"""
+        token = get_cached_user_secret(user.pk)
+
+        if token is None:
+            token = cls.objects.filter(user=user).values_list("token", flat=True).first()
+            if token is not None:
+                set_cached_user_secret(user.pk, token)
+
+        return token
+
+
+@receiver(post_save, sender=UserSecret)
+@receiver(post_delete, sender=UserSecret)
+def _invalidate_user_secret(sender, instance, **kwargs):
+    # Again on commit, a lookup made before then would cache the token the transaction replaces
+    invalidate_user_secret(instance.user_id)
+    transaction.on_commit(lambda: invalidate_user_secret(instance.user_id))
 
 
 class Account(UserManagerMixin):
     number = models.TextField()
     brokerage = models.TextField()
     description = models.TextField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "number", "brokerage"], name="chipmunk_account_unique_number"),
+        ]
+
+    @staticmethod
+    def key_of(account_data):
+        """(number, brokerage) identifying a SnapTrade account payload"""
+        # The legacy holdings payload names the brokerage, the current one only has institution_name
+        return account_data.get("number"), account_data.get("brokerage") or account_data.get("institution_name")
+
+    @classmethod
+    def bulk_upsert(cls, user, accounts_data):
+        """
+        Creates or renames the user's accounts from SnapTrade account payloads
+        in a constant number of queries, returns them keyed by key_of.
+        """
+        existing = {(account.number, account.brokerage): account for account in cls.objects.filter(user=user)}
+
+        to_create = {}
+        to_update = []
+
+        for account_data in accounts_data:
+            key = cls.key_of(account_data)
+            name = account_data.get("name")
+
+            account = existing.get(key)
+
+            if account is None:
+                to_create[key] = cls(user=user, number=key[0], brokerage=key[1], description=name)
+            elif account.description != name:
+                account.description = name
+                to_update.append(account)
+
+        if to_create:
+            # A concurrent refresh may have inserted the same rows, the unique constraint makes that a no-op
+            cls.objects.bulk_create(to_create.values(), ignore_conflicts=True)
+
+        if to_update:
+            cls.objects.bulk_update(to_update, ["description"])
+
+        if to_create:
+            # Primary keys are not set by bulk_create(ignore_conflicts=True)
+            existing = {(account.number, account.brokerage): account for account in cls.objects.filter(user=user)}
+
+        return existing
+
+
+class HoldingsSnapshot(UserManagerMixin):
+    """Last holdings payload pulled for a user by the background sync worker"""
+
+    payload = models.JSONField()
+    fetched_at = models.DateTimeField()
+    next_sync_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user"], name="chipmunk_holdingssnapshot_unique_user"),
+        ]
+
+    @classmethod
+    def store(cls, user, accounts_holdings, next_sync_at):
+        # An UPDATE first and no surrounding transaction, sync workers write concurrently and
+        # SQLite cannot upgrade the read lock update_or_create takes without deadlocking
+        fields = dict(payload=accounts_holdings, fetched_at=timezone.now(), next_sync_at=next_sync_at)
+
+        if not cls.objects.filter(user=user).update(**fields):
+            cls.objects.bulk_create([cls(user=user, **fields)], ignore_conflicts=True)
+
+    @classmethod
+    def postpone(cls, user, next_sync_at):
+        """Moves the next sync of user to next_sync_at, False when the user has no snapshot yet"""
+        return bool(cls.objects.filter(user=user).update(next_sync_at=next_sync_at))
+
+    @classmethod
+    def expire(cls, user):
+        cls.objects.filter(user=user).delete()
+
+    @classmethod
+    def fresh_payload(cls, user, max_age):
+        """Returns the stored holdings of user when they are at most max_age seconds old, None otherwise"""
+        snapshot = (
+            cls.objects.filter(user=user, fetched_at__gte=timezone.now() - timedelta(seconds=max_age))
+            .only("payload")
+            .first()
+        )
+
+        return snapshot.payload if snapshot else None
+
+    @classmethod
+    def last_payload(cls, user):
+        """Returns the stored holdings of user whatever their age, the fallback while upstream is down"""
+        snapshot = cls.objects.filter(user=user).only("payload").first()
+
+        return snapshot.payload if snapshot else None
+
+
+class Position(UserManagerMixin):
+    """A holding of an account, synced_at is when a refresh last wrote it"""
+
+    account = models.ForeignKey(Account, on_delete=models.CASCADE)
+    symbol = models.TextField()
+    description = models.TextField()
+    units = models.FloatField()
+    price = models.FloatField()
+    currency = models.TextField()
+    synced_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["account", "symbol"], name="chipmunk_position_unique_symbol"),
+        ]
+        indexes = [
+            # Portfolio.for_user reads a user's rows in (account, symbol) order
+            models.Index(fields=["user", "account", "symbol"], name="chipmunk_position_user_account"),
+        ]
+
+
+class Balance(UserManagerMixin):
+    """Cash of an account in one currency, synced_at is when a refresh last wrote it"""
+
+    account = models.ForeignKey(Account, on_delete=models.CASCADE)
+    currency = models.TextField()
+    cash = models.FloatField()
+    synced_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["account", "currency"], name="chipmunk_balance_unique_currency"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "account", "currency"], name="chipmunk_balance_user_account"),
+        ]
+
+
+class HoldingsChange(UserManagerMixin):
+    """
+    What one holdings refresh changed in an account, as
+    {"positions"|"balances": {"added"|"removed"|"changed": [...]}}.
+    Ids only grow, consumers page through the feed with the last id they saw.
+    """
+
+    account = models.ForeignKey(Account, on_delete=models.CASCADE)
+    changes = models.JSONField()
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # feed pages through a user's entries by id
+            models.Index(fields=["user", "id"], name="chipmunk_change_user_id"),
+        ]
+
+    @classmethod
+    def feed(cls, user, after=0, limit=100):
+        return list(cls.objects.filter(user=user, id__gt=after).select_related("account").order_by("id")[:limit])
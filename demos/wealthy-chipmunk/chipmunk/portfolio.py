@@ -0,0 +1,179 @@
+"""
+Columnar in-memory holdings.
+
+Positions and balances of every account are held as parallel NumPy arrays
+(units, price, cash, plus indexes into the account and currency tables) so
+market values, weights and totals are vectorized instead of dict loops.
+"""
+
+import numpy as np
+from chipmunk.holdings import merge_balances, merge_positions
+from chipmunk.models import Account, Balance, Position
+
+
+class Portfolio:
+    def __init__(
+        self, accounts, currencies, symbols, units, price, currency, account, cash, cash_currency, cash_account
+    ):
+        # Lookup tables, the int arrays below index them
+        self.accounts = accounts
+        self.currencies = currencies
+        self.currency_index = {code: index for index, code in enumerate(currencies)}
+
+        # One entry per position
+        self.symbols = symbols
+        self.units = units
+        self.price = price
+        self.currency = currency
+        self.account = account
+
+        # One entry per balance
+        self.cash = cash
+        self.cash_currency = cash_currency
+        self.cash_account = cash_account
+
+    @classmethod
+    def from_rows(cls, accounts, positions, balances):
+        """
+        Builds a portfolio from per-account rows: accounts is a list of
+        dict(number, brokerage, name), positions and balances lists of field
+        dicts (as made by chipmunk.holdings) for the account at the same index.
+        """
+        currencies = []
+        currency_index = {}
+
+        def currency_of(code):
+            index = currency_index.get(code)
+            if index is None:
+                index = currency_index[code] = len(currencies)
+                currencies.append(code)
+            return index
+
+        symbols, units, price, currency, account = [], [], [], [], []
+        cash, cash_currency, cash_account = [], [], []
+
+        for account_index, (account_positions, account_balances) in enumerate(zip(positions, balances)):
+            for fields in account_positions:
+                symbols.append(fields["symbol"])
+                units.append(fields["units"])
+                price.append(fields["price"])
+                currency.append(currency_of(fields["currency"]))
+                account.append(account_index)
+
+            for fields in account_balances:
+                cash.append(fields["cash"])
+                cash_currency.append(currency_of(fields["currency"]))
+                cash_account.append(account_index)
+
+        return cls(
+            accounts,
+            currencies,
+            symbols,
+            np.array(units, dtype=np.float64),
+            np.array(price, dtype=np.float64),
+            np.array(currency, dtype=np.intp),
+            np.array(account, dtype=np.intp),
+            np.array(cash, dtype=np.float64),
+            np.array(cash_currency, dtype=np.intp),
+            np.array(cash_account, dtype=np.intp),
+        )
+
+    @classmethod
+    def from_holdings(cls, accounts_holdings):
+        """Builds a portfolio from an account_holdings payload"""
+        accounts, positions, balances = [], [], []
+
+        for account_holdings in accounts_holdings:
+            account = account_holdings.get("account") or {}
+            number, brokerage = Account.key_of(account)
+            accounts.append(dict(number=number, brokerage=brokerage, name=account.get("name")))
+            positions.append(merge_positions({}, account_holdings.get("positions")).values())
+            balances.append(merge_balances({}, account_holdings.get("balances")).values())
+
+        return cls.from_rows(accounts, positions, balances)
+
+    @classmethod
+    def for_user(cls, user):
+        """Builds a portfolio from the stored positions and balances of user in two queries"""
+        return cls.from_models(
+            Position.objects.filter(user=user).select_related("account").order_by("account_id", "symbol"),
+            Balance.objects.filter(user=user).select_related("account").order_by("account_id", "currency"),
+        )
+
+    @classmethod
+    def from_models(cls, positions, balances):
+        """Builds a portfolio from stored Position and Balance rows (with their account selected), grouped by account"""
+        accounts = {}
+        account_positions = {}
+        account_balances = {}
+
+        for position in positions:
+            accounts.setdefault(position.account_id, position.account)
+            account_positions.setdefault(position.account_id, []).append(
+                dict(symbol=position.symbol, units=position.units, price=position.price, currency=position.currency)
+            )
+
+        for balance in balances:
+            accounts.setdefault(balance.account_id, balance.account)
+            account_balances.setdefault(balance.account_id, []).append(
+                dict(cash=balance.cash, currency=balance.currency)
+            )
+
+        return cls.from_rows(
+            [
+                dict(number=account.number, brokerage=account.brokerage, name=account.description)
+                for account in accounts.values()
+            ],
+            [account_positions.get(account_id, ()) for account_id in accounts],
+            [account_balances.get(account_id, ()) for account_id in accounts],
+        )
+
+    def __len__(self):
+        return len(self.units)
+
+    def market_value(self):
+        """Value of every position in its own currency"""
+        return self.units * self.price
+
+    def weights(self, values=None):
+        """
+        Share of every position in the sum of values, market_value() by default.
+        Only meaningful for values in a single currency, see currency_weights.
+        """
+        if values is None:
+            values = self.market_value()
+
+        total = values.sum()
+
+        if not total:
+            return np.zeros_like(values)
+
+        return values / total
+
+    def currency_weights(self):
+        """Share of every position in the market value of the positions sharing its currency"""
+        values = self.market_value()
+        totals = np.bincount(self.currency, weights=values, minlength=len(self.currencies))
+
+        return np.divide(values, totals[self.currency], out=np.zeros_like(values), where=totals[self.currency] != 0)
+
+    def currency_totals(self, include_cash=True):
+        """{currency code: market value of the positions, plus cash when include_cash}"""
+        totals = np.bincount(self.currency, weights=self.market_value(), minlength=len(self.currencies))
+
+        if include_cash:
+            totals += np.bincount(self.cash_currency, weights=self.cash, minlength=len(self.currencies))
+
+        return dict(zip(self.currencies, totals.tolist()))
+
+    def account_totals(self, values=None, cash=None):
+        """Sum of values (and cash) per account, in the order of self.accounts"""
+        if values is None:
+            values = self.market_value()
+
+        totals = np.bincount(self.account, weights=values, minlength=len(self.accounts))
+
+        if cash is not None:
+            totals += np.bincount(self.cash_account, weights=cash, minlength=len(self.accounts))
+
+        return totals
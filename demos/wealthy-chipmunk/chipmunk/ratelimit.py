@@ -0,0 +1,195 @@
+"""
+Token buckets in front of upstream SnapTrade calls.
+
+Every request takes a token from the bucket of its partner and from the
+bucket of its (partner, endpoint). Requests waiting for tokens are served
+by priority class, then in arrival order, so a login redirect queued behind
+a burst of background holdings refreshes goes first. A 429 from upstream
+empties the partner bucket for its Retry-After instead of being retried
+straight away.
+"""
+import bisect
+import itertools
+import os
+import threading
+import time
+
+from chipmunk.resilience import UpstreamUnavailable
+from django.conf import settings
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+class RateLimitTimeout(UpstreamUnavailable):
+    """No token became available within the caller's max wait"""
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        # now may predate a bucket created after the caller read the clock
+        if now <= self.updated:
+            return
+
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        """Seconds until a token is available"""
+        self.refill(now)
+
+        if self.tokens >= 1:
+            return 0.0
+
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def drain(self, now, seconds):
+        """Leaves no token for the next seconds"""
+        self.refill(now)
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+class RateLimitScheduler:
+    def __init__(self, partner_limit, endpoint_limit):
+        # (rate per second, burst) pairs, None disables that level
+        self.partner_limit = partner_limit
+        self.endpoint_limit = endpoint_limit
+        self.buckets = {}
+        self.condition = threading.Condition()
+        # (priority, sequence, bucket keys) of every request waiting for tokens, in serving order
+        self.waiting = []
+        self.sequence = itertools.count()
+
+    def bucket_keys(self, partner_id, endpoint_name):
+        keys = []
+
+        if self.partner_limit:
+            keys.append((partner_id,))
+        if self.endpoint_limit:
+            keys.append((partner_id, endpoint_name))
+
+        return tuple(keys)
+
+    def bucket(self, key):
+        bucket = self.buckets.get(key)
+
+        if bucket is None:
+            rate, burst = self.partner_limit if len(key) == 1 else self.endpoint_limit
+            bucket = self.buckets[key] = TokenBucket(rate, burst)
+
+        return bucket
+
+    def wait_time(self, ticket, now):
+        """Seconds until ticket may take its tokens, None while a ticket ahead of it shares a bucket"""
+        keys = ticket[2]
+
+        for other in self.waiting:
+            if other is ticket:
+                break
+            if any(key in keys for key in other[2]):
+                return None
+
+        return max([self.bucket(key).wait_time(now) for key in keys], default=0.0)
+
+    def try_acquire(self, partner_id, endpoint_name, priority=INTERACTIVE):
+        """Takes the tokens when nobody is queued for them and they are available now, never blocks"""
+        keys = self.bucket_keys(partner_id, endpoint_name)
+
+        with self.condition:
+            # Not queued itself, so any waiting ticket that shares a bucket comes first
+            if self.wait_time((priority, None, keys), time.monotonic()) != 0:
+                return False
+
+            for key in keys:
+                self.bucket(key).take()
+
+        return True
+
+    def acquire(self, partner_id, endpoint_name, priority=INTERACTIVE, max_wait=None):
+        """Blocks until the tokens of the call are taken, returns the seconds spent waiting"""
+        keys = self.bucket_keys(partner_id, endpoint_name)
+
+        if not keys:
+            return 0.0
+
+        started = time.monotonic()
+        deadline = None if max_wait is None else started + max_wait
+
+        with self.condition:
+            ticket = (priority, next(self.sequence), keys)
+            bisect.insort(self.waiting, ticket)
+
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self.wait_time(ticket, now)
+
+                    if wait == 0:
+                        for key in keys:
+                            self.bucket(key).take()
+                        return now - started
+
+                    if deadline is not None:
+                        if now >= deadline:
+                            raise RateLimitTimeout("No %s token within %ss" % (endpoint_name, max_wait))
+                        wait = deadline - now if wait is None else min(wait, deadline - now)
+
+                    self.condition.wait(wait)
+            finally:
+                self.waiting.remove(ticket)
+                self.condition.notify_all()
+
+    def throttled(self, partner_id, retry_after):
+        """Upstream answered 429, holds every call of the partner back for retry_after seconds"""
+        if not self.partner_limit:
+            return
+
+        with self.condition:
+            self.bucket((partner_id,)).drain(time.monotonic(), retry_after)
+            self.condition.notify_all()
+
+
+def get_scheduler():
+    """Returns the process-wide scheduler shared by every SnapTradeWrapper"""
+    global _scheduler
+
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = RateLimitScheduler(
+                    getattr(settings, "SNAPTRADE_RATE_LIMIT", None),
+                    getattr(settings, "SNAPTRADE_ENDPOINT_RATE_LIMIT", None),
+                )
+
+    return _scheduler
+
+
+def retry_after(response, default=1.0):
+    """Seconds from the Retry-After header of a 429 response"""
+    try:
+        return max(0.0, float(response.headers.get("Retry-After", default)))
+    except ValueError:
+        return default
+
+
+def _reset_after_fork():
+    global _scheduler, _scheduler_lock
+
+    _scheduler = None
+    _scheduler_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
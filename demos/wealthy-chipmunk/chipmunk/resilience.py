@@ -0,0 +1,223 @@
+"""
+Retries, hedging and circuit breaking for upstream SnapTrade calls.
+
+Only idempotent methods are retried, after a jittered exponential backoff.
+A hedge sends a second copy of a slow idempotent call and keeps whichever
+answer comes first. Each operation has a circuit breaker: after a run of
+failed calls, retries included, it fails calls fast with CircuitOpen, so
+callers can serve cached data, and lets one probe through every
+reset_timeout seconds until upstream recovers. Failed calls made for the
+same user count once, one user's broken accounts do not open it for all.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+IDEMPOTENT_METHODS = frozenset(("get", "head", "options", "put", "delete"))
+
+# Statuses worth another attempt, 429 is paced by the rate limit scheduler rather than counted as a failure
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+FAILURE_STATUSES = frozenset((500, 502, 503, 504))
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+_hedge_executor = None
+
+
+class UpstreamUnavailable(Exception):
+    """SnapTrade could not be reached, or is being given time to recover"""
+
+
+class CircuitOpen(UpstreamUnavailable):
+    pass
+
+
+class RetryPolicy:
+    def __init__(self, attempts=3, backoff=0.2, max_backoff=2.0):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            attempts=getattr(settings, "SNAPTRADE_RETRY_ATTEMPTS", 3),
+            backoff=getattr(settings, "SNAPTRADE_RETRY_BACKOFF", 0.2),
+            max_backoff=getattr(settings, "SNAPTRADE_RETRY_MAX_BACKOFF", 2.0),
+        )
+
+    def retry_delay(self, method, attempt, status=None):
+        """
+        Seconds to sleep before retrying a call whose attempt (counted from 0)
+        failed with status, or with a transport error when status is None.
+        None when the call must not be retried.
+        """
+        if method not in IDEMPOTENT_METHODS or attempt + 1 >= self.attempts:
+            return None
+
+        if status is not None and status not in RETRY_STATUSES:
+            return None
+
+        # Full jitter keeps clients that failed together from retrying together
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, name, threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        # Keys of the failures counted since the last success
+        self.failed_keys = set()
+        self.opened_at = 0.0
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        """Raises CircuitOpen unless the call may go out"""
+        with self.lock:
+            if self.state == self.CLOSED:
+                return
+
+            now = time.monotonic()
+
+            if now - self.opened_at < self.reset_timeout:
+                raise CircuitOpen("%s is failing, retrying in %.0fs" % (self.name, self.reset_timeout))
+
+            # One probe per reset_timeout, a probe that never reports back only costs one period
+            self.state = self.HALF_OPEN
+            self.opened_at = now
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.failed_keys.clear()
+
+    def record_failure(self, key=None):
+        """key is who the call was made for, e.g. a user, a key counts once toward the threshold until a success"""
+        with self.lock:
+            if key is None or key not in self.failed_keys:
+                self.failures += 1
+
+                if key is not None:
+                    self.failed_keys.add(key)
+
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.failed_keys.clear()
+
+    def record(self, status=None, key=None):
+        """Records the outcome of a call once its retries are over, status None meaning a transport error"""
+        if status is None or status in FAILURE_STATUSES:
+            self.record_failure(key)
+        else:
+            self.record_success()
+
+
+def get_breaker(name):
+    """Returns the process-wide circuit breaker of an operation"""
+    breaker = _breakers.get(name)
+
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = _breakers[name] = CircuitBreaker(
+                    name,
+                    threshold=getattr(settings, "SNAPTRADE_BREAKER_THRESHOLD", 5),
+                    reset_timeout=getattr(settings, "SNAPTRADE_BREAKER_RESET_TIMEOUT", 30),
+                )
+
+    return breaker
+
+
+def _get_hedge_executor():
+    global _hedge_executor
+
+    if _hedge_executor is None:
+        with _breakers_lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "SNAPTRADE_POOL_MAXSIZE", 20), thread_name_prefix="snaptrade-hedge"
+                )
+
+    return _hedge_executor
+
+
+def hedged(send, delay, hedge_allowed=None):
+    """
+    Calls send, and calls it a second time when the first call has not
+    answered within delay seconds and hedge_allowed() agrees. Returns the
+    first answer, an error only wins when both calls fail.
+    """
+    executor = _get_hedge_executor()
+
+    first = executor.submit(send)
+    done, _ = wait([first], timeout=delay)
+
+    if done or (hedge_allowed is not None and not hedge_allowed()):
+        return first.result()
+
+    pending = {first, executor.submit(send)}
+
+    while True:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            if future.exception() is None:
+                # The losing call cannot be cancelled once sent, its answer is dropped
+                return future.result()
+
+        if not pending:
+            return done.pop().result()
+
+
+async def hedged_async(send, delay, hedge_allowed=None):
+    """hedged for coroutines, send returns a new awaitable on each call and the losing call is cancelled"""
+    first = asyncio.ensure_future(send())
+    done, _ = await asyncio.wait({first}, timeout=delay)
+
+    if done or (hedge_allowed is not None and not hedge_allowed()):
+        return await first
+
+    pending = {first, asyncio.ensure_future(send())}
+
+    try:
+        while True:
+            done, pending = await asyncio.wait(pending, return_when=FIRST_COMPLETED)
+
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+
+            if not pending:
+                return done.pop().result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def _reset_after_fork():
+    global _breakers, _breakers_lock, _hedge_executor
+
+    _breakers = {}
+    _breakers_lock = threading.Lock()
+    _hedge_executor = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
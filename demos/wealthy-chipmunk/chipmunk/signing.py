@@ -0,0 +1,56 @@
+import hmac
+import json
+from base64 import b64encode
+from functools import lru_cache
+from hashlib import sha256
+
+# json.dumps builds a new JSONEncoder whenever it gets options, so keep one around
+_encoder = json.JSONEncoder(separators=(",", ":"), sort_keys=True)
+_encode = _encoder.encode
+
+
+def signed_content(request_data, request_path, request_query):
+    """
+    Canonical SignedContent payload, byte for byte what
+    json.dumps({"content": ..., "path": ..., "query": ...}, separators=(",", ":"), sort_keys=True)
+    returns. The top level keys are already in sorted order so only the values go through the encoder.
+    """
+    return '{"content":%s,"path":%s,"query":%s}' % (
+        _encode(request_data),
+        _encode(request_path),
+        _encode(request_query),
+    )
+
+
+class Signer:
+    """HMAC-SHA256 request signer which keys the hash once and copies the keyed state for every signature"""
+
+    def __init__(self, consumer_key):
+        if isinstance(consumer_key, str):
+            consumer_key = consumer_key.encode()
+
+        self._keyed = hmac.new(consumer_key, digestmod=sha256)
+
+    def sign(self, request_data, request_path, request_query):
+        sig_hmac = self._keyed.copy()
+        sig_hmac.update(signed_content(request_data, request_path, request_query).encode())
+
+        return b64encode(sig_hmac.digest()).decode()
+
+    def sign_many(self, requests):
+        """Signs an iterable of (request_data, request_path, request_query) tuples"""
+        keyed_copy = self._keyed.copy
+        signatures = []
+
+        for request_data, request_path, request_query in requests:
+            sig_hmac = keyed_copy()
+            sig_hmac.update(signed_content(request_data, request_path, request_query).encode())
+            signatures.append(b64encode(sig_hmac.digest()).decode())
+
+        return signatures
+
+
+@lru_cache(maxsize=None)
+def get_signer(consumer_key):
+    """Returns the process-wide Signer for consumer_key"""
+    return Signer(consumer_key)
@@ -0,0 +1,93 @@
+"""
+Streamed rendering of the holdings dashboard.
+
+The page shell is sent before any holdings are read, then one account
+section at a time as SnapTradeWrapper.stream_account_holdings produces the
+accounts, so the first bytes of a large portfolio do not wait on its last
+account. Under ASGI the sections are rendered on a worker thread, the
+holdings are read with blocking I/O.
+"""
+import logging
+
+from asgiref.sync import sync_to_async
+from chipmunk.models import UserSecret
+from chipmunk.portfolio import Portfolio
+from chipmunk.resilience import UpstreamUnavailable
+from chipmunk.valuation import Valuation
+from chipmunk.view_models import holdings_view_model
+from django.conf import settings
+from django.db import DatabaseError
+from django.http import StreamingHttpResponse
+from django_jinja.backend import Jinja2
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+class BlockingStreamingHttpResponse(StreamingHttpResponse):
+    """
+    A StreamingHttpResponse over an iterator that blocks, e.g. on the ORM.
+    WSGI iterates it as usual, chipmunk.asgi iterates it with async for,
+    which pulls every part through sync_to_async, off the event loop.
+    """
+
+    async def __aiter__(self):
+        parts = iter(self)
+        next_part = sync_to_async(next)
+
+        while True:
+            part = await next_part(parts, _END)
+            if part is _END:
+                return
+            yield part
+
+
+class HoldingsStream:
+    """The account sections of home_stream.jinja, fetched and rendered while the page is being sent"""
+
+    def __init__(self, wrapper, base=None):
+        self.wrapper = wrapper
+        self.base = base or settings.SNAPTRADE_BASE_CURRENCY
+        self.rates = None
+        self.accounts_holdings = []
+        self.error = None
+
+    def sections(self):
+        """Yields the rendered section of every account, as soon as its holdings are in"""
+        account_section = Jinja2.get_default().env.get_template("account_section.jinja").module.account_section
+
+        try:
+            yield from self._sections(account_section)
+        except UserSecret.DoesNotExist:
+            # The secret was deleted since the view checked it, the page falls back to Connect SnapTrade
+            self.accounts_holdings = []
+        except UpstreamUnavailable:
+            if self.accounts_holdings:
+                self.error = "Some accounts are unavailable right now"
+            else:
+                self.error = "Holdings are unavailable right now"
+        except DatabaseError:
+            logger.exception("Streaming the holdings of user %s failed", self.wrapper.user.pk)
+            self.error = "Holdings are unavailable right now"
+
+    def _sections(self, account_section):
+        try:
+            self.rates = self.wrapper.exchange_rates()
+        except UpstreamUnavailable:
+            self.rates = None
+
+        for account_holdings in self.wrapper.stream_account_holdings():
+            self.accounts_holdings.append(account_holdings)
+            [group] = holdings_view_model([account_holdings], self.valuation([account_holdings]))
+            yield account_section(group)
+
+        if self.accounts_holdings:
+            self.wrapper.prefetch_login_redirect()
+
+    def valuation(self, accounts_holdings=None):
+        """The streamed accounts (or accounts_holdings) valued in base, None without FX rates"""
+        if self.rates is None:
+            return None
+
+        return Valuation(Portfolio.from_holdings(accounts_holdings or self.accounts_holdings), self.rates, self.base)
@@ -0,0 +1,118 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from chipmunk.caching import set_cached_holdings
+from chipmunk.integrations import SnapTradeWrapper
+from chipmunk.models import HoldingsSnapshot, UserManager
+from chipmunk.ratelimit import BACKGROUND
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class HoldingsSyncWorker:
+    """
+    Refreshes the stored holdings of every user with a SnapTrade secret on a
+    per-user schedule. Each sync pushes the user's next run interval seconds
+    out, give or take jitter, so refreshes spread out instead of bunching up.
+    """
+
+    def __init__(self, interval=300, jitter=60, workers=4, batch_size=100, retry_interval=60):
+        self.interval = interval
+        self.jitter = jitter
+        self.workers = workers
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self.rng = random.Random()
+        # user pk -> monotonic time before which a failed user without a snapshot is not retried
+        self.backoff = {}
+        self.backoff_lock = threading.Lock()
+
+    def next_sync_at(self, now):
+        return now + timedelta(seconds=max(0, self.interval + self.rng.uniform(-self.jitter, self.jitter)))
+
+    def due_users(self, now):
+        """Up to batch_size users due for a sync, the longest overdue first"""
+        with self.backoff_lock:
+            monotonic_now = time.monotonic()
+            self.backoff = {pk: until for pk, until in self.backoff.items() if until > monotonic_now}
+            backed_off = list(self.backoff)
+
+        # Users never synced have no snapshot and come first, the user secret and snapshot are one per user
+        return list(
+            UserManager.objects.filter(usersecret__isnull=False)
+            .exclude(holdingssnapshot__next_sync_at__gt=now)
+            .exclude(pk__in=backed_off)
+            .order_by(F("holdingssnapshot__next_sync_at").asc(nulls_first=True), "pk")[: self.batch_size]
+        )
+
+    def sync_user(self, user):
+        ok = False
+
+        try:
+            ok, accounts_holdings = SnapTradeWrapper(user, priority=BACKGROUND).fetch_account_holdings()
+
+            if ok:
+                HoldingsSnapshot.store(user, accounts_holdings, self.next_sync_at(timezone.now()))
+                set_cached_holdings(user, accounts_holdings)
+        except Exception:
+            logger.exception("Holdings sync failed for user %s", user.pk)
+        finally:
+            connection.close()
+
+        if ok:
+            with self.backoff_lock:
+                self.backoff.pop(user.pk, None)
+        else:
+            self.back_off(user)
+
+        return ok
+
+    def back_off(self, user):
+        """Pushes the next sync of a failed user retry_interval seconds out, give or take jitter"""
+        retry_in = self.retry_interval + self.rng.uniform(0, self.jitter)
+
+        try:
+            # Stored with the snapshot so a failing user drops to the back of the queue for every worker
+            postponed = HoldingsSnapshot.postpone(user, timezone.now() + timedelta(seconds=retry_in))
+        except Exception:
+            logger.exception("Could not postpone the holdings sync of user %s", user.pk)
+            postponed = False
+        finally:
+            connection.close()
+
+        # A user never synced has no snapshot yet, this worker skips them until then
+        if not postponed:
+            with self.backoff_lock:
+                self.backoff[user.pk] = time.monotonic() + retry_in
+
+    def run_once(self):
+        """Syncs every user that is due, returns (attempted, succeeded)"""
+        users = self.due_users(timezone.now())
+
+        if not users:
+            return 0, 0
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(users))) as executor:
+            results = list(executor.map(self.sync_user, users))
+
+        return len(users), sum(results)
+
+    def run_forever(self, poll=5, stop_event=None):
+        stop_event = stop_event or threading.Event()
+
+        while not stop_event.is_set():
+            attempted, succeeded = self.run_once()
+
+            if attempted:
+                logger.info("Synced holdings for %d of %d due users", succeeded, attempted)
+
+            # A full batch means more users are waiting, go again right away
+            if attempted < self.batch_size:
+                stop_event.wait(poll)
@@ -1,3 +1,484 @@
-from django.test import TestCase
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import requests
+from chipmunk import holdings, resilience
+from chipmunk.coalescing import SingleFlight
+from chipmunk.holdings import diff_holdings, normalize_holdings, store_holdings
+from chipmunk.integrations import AsyncSnapTradeWrapper, SnapTradeWrapper
+from chipmunk.management.commands.bench_signing import reference_sign, request_bodies, request_queries
+from chipmunk.models import Balance, HoldingsChange, Position, UserManager, UserSecret
+from chipmunk.portfolio import Portfolio
+from chipmunk.ratelimit import BACKGROUND, INTERACTIVE, RateLimitScheduler, RateLimitTimeout
+from chipmunk.resilience import CircuitBreaker, CircuitOpen, UpstreamUnavailable
+from chipmunk.signing import Signer
+from chipmunk.valuation import RateMatrix, Valuation
+from django.test import TestCase, override_settings
+
+
+def position(symbol, units, price=10.0, currency="CAD"):
+    return dict(symbol=dict(symbol=dict(symbol=symbol, currency=dict(code=currency))), units=units, price=price)
+
+
+def account_holdings(number, positions, cash=100.0):
+    return dict(
+        account=dict(number=number, institution_name="Questrade", name="Account %s" % number),
+        positions=positions,
+        balances=[dict(currency=dict(code="CAD"), cash=cash)],
+    )
+
+
+class StoreHoldingsTests(TestCase):
+    def setUp(self):
+        self.user = UserManager.objects.create(username="chipmunk@example.com", email="chipmunk@example.com")
+
+    def stored_units(self):
+        return dict(Position.objects.filter(user=self.user).values_list("symbol", "units"))
+
+    def test_added_rows(self):
+        feed = store_holdings(self.user, [account_holdings("1", [position("VAB", 2), position("XIC", 3)])])
+
+        self.assertEqual(self.stored_units(), {"VAB": 2, "XIC": 3})
+        self.assertEqual(Balance.objects.get(user=self.user).cash, 100.0)
+        self.assertEqual(len(feed), 1)
+        self.assertEqual(sorted(entry["symbol"] for entry in feed[0].changes["positions"]["added"]), ["VAB", "XIC"])
+
+    def test_changed_rows(self):
+        store_holdings(self.user, [account_holdings("1", [position("VAB", 2), position("XIC", 3)])])
+
+        feed = store_holdings(self.user, [account_holdings("1", [position("VAB", 5), position("XIC", 3)])])
+
+        self.assertEqual(self.stored_units(), {"VAB": 5, "XIC": 3})
+        self.assertEqual(
+            feed[0].changes,
+            {"positions": {"changed": [{"symbol": "VAB", "before": {"units": 2}, "after": {"units": 5}}]}},
+        )
+
+    def test_removed_rows(self):
+        store_holdings(self.user, [account_holdings("1", [position("VAB", 2), position("XIC", 3)])])
+
+        feed = store_holdings(self.user, [account_holdings("1", [position("VAB", 2)])])
+
+        self.assertEqual(self.stored_units(), {"VAB": 2})
+        self.assertEqual(feed[0].changes, {"positions": {"removed": [{"symbol": "XIC"}]}})
+
+    def test_unchanged_refresh_writes_nothing(self):
+        payload = [account_holdings("1", [position("VAB", 2)])]
+        store_holdings(self.user, payload)
+
+        self.assertEqual(store_holdings(self.user, payload), [])
+        self.assertEqual(HoldingsChange.objects.filter(user=self.user).count(), 1)
+
+    def test_accounts_missing_from_the_payload_keep_their_rows(self):
+        store_holdings(
+            self.user, [account_holdings("1", [position("VAB", 2)]), account_holdings("2", [position("XIC", 3)])]
+        )
+
+        store_holdings(self.user, [account_holdings("1", [position("VAB", 4)])])
+
+        self.assertEqual(self.stored_units(), {"VAB": 4, "XIC": 3})
+
+    def test_concurrent_insert_is_diffed_again(self):
+        payload = [account_holdings("1", [position("VAB", 2), position("XIC", 3)])]
+
+        # A concurrent refresh of the same payload diffed before this one, and commits right after this one's diff
+        racing = diff_holdings(self.user, normalize_holdings(self.user, payload))
+        diff = holdings.diff_holdings
+        diffs = []
+
+        def diff_then_race(*args, **kwargs):
+            change_set = diff(*args, **kwargs)
+            if not diffs:
+                racing.apply()
+            diffs.append(change_set)
+            return change_set
+
+        with mock.patch("chipmunk.holdings.diff_holdings", side_effect=diff_then_race):
+            feed = store_holdings(self.user, payload)
+
+        self.assertEqual(len(diffs), 2)
+        self.assertEqual(feed, [])
+        self.assertEqual(self.stored_units(), {"VAB": 2, "XIC": 3})
+        self.assertEqual(HoldingsChange.objects.filter(user=self.user).count(), 1)
+
+
+class CircuitBreakerTests(TestCase):
+    def test_opens_after_threshold_failures(self):
+        breaker = CircuitBreaker("holdings", threshold=3, reset_timeout=30)
+
+        for _ in range(3):
+            breaker.before_call()
+            breaker.record(503)
+
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpen):
+            breaker.before_call()
+
+    def test_success_and_client_errors_reset_the_count(self):
+        breaker = CircuitBreaker("holdings", threshold=2, reset_timeout=30)
+
+        breaker.record(500)
+        breaker.record(404)
+        breaker.record(None)
+
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(breaker.failures, 1)
+
+    def test_failures_of_one_key_count_once(self):
+        breaker = CircuitBreaker("holdings", threshold=2, reset_timeout=30)
+
+        for _ in range(5):
+            breaker.record(503, key=1)
+
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+        breaker.record(503, key=2)
+
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+    def test_half_open_probe(self):
+        breaker = CircuitBreaker("holdings", threshold=1, reset_timeout=0.05)
+        breaker.record(503)
+
+        time.sleep(0.06)
+        breaker.before_call()
+
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        # Only one probe per reset_timeout
+        with self.assertRaises(CircuitOpen):
+            breaker.before_call()
+
+        breaker.record(200)
+
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+
+class RateLimitSchedulerTests(TestCase):
+    def wait_for_queue(self, scheduler, length):
+        while len(scheduler.waiting) < length:
+            time.sleep(0.005)
+
+    def test_interactive_is_served_before_queued_background(self):
+        scheduler = RateLimitScheduler((20, 1), None)
+        scheduler.acquire("P", "holdings")
+        served = []
+
+        def acquire(priority):
+            scheduler.acquire("P", "holdings", priority)
+            served.append(priority)
+
+        with ThreadPoolExecutor(2) as executor:
+            background = executor.submit(acquire, BACKGROUND)
+            self.wait_for_queue(scheduler, 1)
+            interactive = executor.submit(acquire, INTERACTIVE)
+            self.wait_for_queue(scheduler, 2)
+            background.result(), interactive.result()
+
+        self.assertEqual(served, [INTERACTIVE, BACKGROUND])
+
+    def test_try_acquire_does_not_jump_a_queued_ticket_sharing_a_bucket(self):
+        # Plenty of partner tokens, one holdings token every 0.2s
+        scheduler = RateLimitScheduler((100, 10), (5, 1))
+        scheduler.acquire("P", "holdings")
+
+        with ThreadPoolExecutor(1) as executor:
+            queued = executor.submit(scheduler.acquire, "P", "holdings")
+            self.wait_for_queue(scheduler, 1)
+
+            # accounts shares the partner bucket with the queued holdings ticket, another partner does not
+            self.assertFalse(scheduler.try_acquire("P", "accounts"))
+            self.assertTrue(scheduler.try_acquire("Q", "accounts"))
+
+            queued.result()
+
+        self.assertTrue(scheduler.try_acquire("P", "accounts"))
+
+    def test_max_wait_times_out(self):
+        scheduler = RateLimitScheduler((1, 1), None)
+        scheduler.acquire("P", "holdings")
+
+        with self.assertRaises(RateLimitTimeout):
+            scheduler.acquire("P", "holdings", max_wait=0.05)
+
+        self.assertEqual(scheduler.waiting, [])
+
+    def test_throttled_holds_calls_back_for_retry_after(self):
+        scheduler = RateLimitScheduler((100, 5), None)
+
+        scheduler.throttled("P", 0.2)
+
+        self.assertFalse(scheduler.try_acquire("P", "holdings"))
+        self.assertGreaterEqual(scheduler.acquire("P", "holdings"), 0.19)
+
+
+def pair(src, dst, rate):
+    return dict(src=dict(code=src), dst=dict(code=dst), exchange_rate=rate)
+
+
+class ValuationTests(TestCase):
+    def setUp(self):
+        self.rates = RateMatrix.from_pairs([pair("USD", "CAD", 1.25), pair("EUR", "USD", 1.1)])
+
+    def rate(self, src, dst):
+        return self.rates.factors([src], dst)[0]
+
+    def test_known_and_inverse_rates(self):
+        self.assertEqual(self.rates.currencies, ["CAD", "EUR", "USD"])
+        self.assertAlmostEqual(self.rate("USD", "CAD"), 1.25)
+        self.assertAlmostEqual(self.rate("CAD", "USD"), 0.8)
+        self.assertAlmostEqual(self.rate("CAD", "CAD"), 1.0)
+
+    def test_rates_routed_through_an_intermediate_currency(self):
+        self.assertAlmostEqual(self.rate("EUR", "CAD"), 1.375)
+        self.assertAlmostEqual(self.rate("CAD", "EUR"), 1 / 1.375)
+
+    def test_currencies_without_a_rate_are_left_out_and_named(self):
+        portfolio = Portfolio.from_holdings(
+            [
+                account_holdings("1", [position("VAB", 2)]),
+                account_holdings("2", [position("SPY", 1, 100.0, "USD"), position("7203", 1, 1000.0, "JPY")]),
+            ]
+        )
+
+        valuation = Valuation(portfolio, self.rates, "CAD")
+
+        self.assertEqual(valuation.unconverted, ["JPY"])
+        self.assertEqual(valuation.account_unconverted(), [[], ["JPY"]])
+        self.assertAlmostEqual(valuation.positions_total, 20 + 125)
+        self.assertAlmostEqual(valuation.total, 20 + 125 + 2 * 100)
+
+    def test_no_rate_to_an_unknown_base(self):
+        self.assertTrue(np.isnan(self.rate("USD", "JPY")))
+        self.assertEqual(self.rate("JPY", "JPY"), 1.0)
+
+
+def response(status_code, headers=None):
+    return mock.Mock(status_code=status_code, headers=headers or {})
+
+
+@override_settings(SNAPTRADE_RETRY_ATTEMPTS=3, SNAPTRADE_RETRY_BACKOFF=0, SNAPTRADE_HEDGE_AFTER=None)
+class MakeRequestTests(TestCase):
+    def setUp(self):
+        self.user = UserManager.objects.create(username="chipmunk@example.com", email="chipmunk@example.com")
+        UserSecret.save_token(self.user, "SECRET")
+        self.wrapper = SnapTradeWrapper(self.user)
+
+        breakers = mock.patch.dict(resilience._breakers, clear=True)
+        breakers.start()
+        self.addCleanup(breakers.stop)
+
+    def send(self, *responses):
+        """Patches the shared session to answer with responses in turn, returns its request mock"""
+        patcher = mock.patch("chipmunk.integrations.get_session")
+        self.addCleanup(patcher.stop)
+        session = patcher.start().return_value
+        session.request.side_effect = list(responses)
+        return session.request
+
+    def test_retries_a_server_error(self):
+        request = self.send(response(503), response(200))
+
+        self.assertEqual(self.wrapper.call("accounts").status_code, 200)
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(resilience.get_breaker("accounts").failures, 0)
+
+    def test_breaker_records_a_failed_call_once(self):
+        request = self.send(response(503), response(503), response(503))
+
+        self.assertEqual(self.wrapper.call("accounts").status_code, 503)
+        self.assertEqual(request.call_count, 3)
+        self.assertEqual(resilience.get_breaker("accounts").failures, 1)
+
+    def test_client_errors_are_not_retried(self):
+        request = self.send(response(404))
+
+        self.assertEqual(self.wrapper.call("accounts").status_code, 404)
+        self.assertEqual(request.call_count, 1)
+
+    def test_non_idempotent_calls_are_not_retried(self):
+        request = self.send(response(503))
+
+        self.assertEqual(self.wrapper.call("login").status_code, 503)
+        self.assertEqual(request.call_count, 1)
+
+    def test_transport_errors_raise_upstream_unavailable(self):
+        self.send(*[requests.ConnectionError("refused")] * 3)
+
+        with self.assertRaises(UpstreamUnavailable):
+            self.wrapper.call("accounts")
+
+    def test_retry_after_holds_the_retry_back(self):
+        self.send(response(429, {"Retry-After": "0.2"}), response(200))
+
+        started = time.monotonic()
+        self.assertEqual(self.wrapper.call("accounts").status_code, 200)
+
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+    def test_fan_out_sends_the_query_params_the_spec_requires(self):
+        accounts = mock.Mock(status_code=200, headers={}, json=lambda: [dict(id="A1", number="1")])
+        resource = mock.Mock(status_code=200, headers={}, json=lambda: [])
+        request = self.send(accounts, resource, resource)
+
+        self.wrapper.account_holdings_concurrent(max_workers=1)
+
+        self.assertEqual(request.call_count, 3)
+        for call in request.call_args_list:
+            self.assertEqual(
+                sorted(call.kwargs["params"]), ["clientId", "timestamp", "userId", "userSecret"], call.args[1]
+            )
+
+
+class SingleFlightTests(TestCase):
+    def test_concurrent_callers_share_one_call(self):
+        flights = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            return ["holdings"]
+
+        with mock.patch.object(flights, "_join", wraps=flights._join) as join, ThreadPoolExecutor(4) as executor:
+            futures = [executor.submit(flights.do, "key", fetch) for _ in range(4)]
+            while join.call_count < 4:
+                time.sleep(0.01)
+            release.set()
+            results = [future.result() for future in futures]
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(flights.in_flight(), 0)
+
+    def test_callers_share_the_error(self):
+        flights = SingleFlight()
+        release = threading.Event()
+
+        def fail():
+            release.wait(5)
+            raise UpstreamUnavailable("down")
+
+        with mock.patch.object(flights, "_join", wraps=flights._join) as join, ThreadPoolExecutor(2) as executor:
+            leader = executor.submit(flights.do, "key", fail)
+            while flights.in_flight() == 0:
+                time.sleep(0.01)
+            follower = executor.submit(flights.do, "key", lambda: "not called")
+            while join.call_count < 2:
+                time.sleep(0.01)
+            release.set()
+
+            for future in (leader, follower):
+                with self.assertRaises(UpstreamUnavailable):
+                    future.result()
+
+    def test_async_callers_join_a_flight_started_by_a_thread(self):
+        flights = SingleFlight()
+        release = threading.Event()
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            leader = executor.submit(flights.do, "key", lambda: release.wait(5) and ["holdings"])
+            while flights.in_flight() == 0:
+                time.sleep(0.01)
+
+            async def follow():
+                async def not_called():
+                    return "not called"
+
+                follower = asyncio.ensure_future(flights.do_async("key", not_called))
+                # Runs the follower up to its wait on the thread's flight
+                await asyncio.sleep(0)
+                release.set()
+                return await follower
+
+            self.assertIs(asyncio.run(follow()), leader.result())
+
+    def test_different_keys_do_not_share(self):
+        flights = SingleFlight()
+
+        async def fetch(value):
+            return value
+
+        async def both():
+            return await asyncio.gather(
+                flights.do_async("a", lambda: fetch(1)), flights.do_async("b", lambda: fetch(2))
+            )
+
+        self.assertEqual(asyncio.run(both()), [1, 2])
+
+
+class SignerTests(TestCase):
+    consumer_key = b"YOUR_CONSUMER_KEY"
+
+    def requests(self):
+        rng = random.Random(0)
+        bodies = dict(
+            request_bodies(rng),
+            unicode=dict(name="Épargne – 日本", amount=1.5, nested=[None, True, {"b": 1, "a": [2, "\u2028"]}]),
+            empty={},
+        )
+
+        for body in bodies.values():
+            for query in request_queries(rng).values():
+                for path in ("/api/v1/accounts", "/api/v1/accounts/A%2FB/holdings"):
+                    yield body, path, "&".join("%s=%s" % item for item in query.items())
+
+    def test_sign_matches_the_reference_algorithm(self):
+        signer = Signer(self.consumer_key)
+
+        for request in self.requests():
+            self.assertEqual(signer.sign(*request), reference_sign(self.consumer_key, *request))
+
+    def test_sign_many_matches_sign(self):
+        signer = Signer(self.consumer_key.decode())
+        requests = list(self.requests())
+
+        self.assertEqual(signer.sign_many(requests), [reference_sign(self.consumer_key, *r) for r in requests])
+
+
+class ViewTests(TestCase):
+    def setUp(self):
+        self.user = UserManager.objects.create(username="chipmunk@example.com", email="chipmunk@example.com")
+        UserSecret.save_token(self.user, "SECRET")
+        self.client.force_login(self.user)
+
+    def redirect_to(self, *args, **kwargs):
+        """Patches the login redirect lookup of AsyncSnapTradeWrapper"""
+        patcher = mock.patch.object(AsyncSnapTradeWrapper, "cached_login_user_redirect", *args, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def test_login_redirects_render_the_error_when_upstream_is_down(self):
+        for error in (CircuitOpen("login is failing"), RateLimitTimeout("No login token within 1s")):
+            self.redirect_to(side_effect=error)
+
+            for url in ("/chipmunk/passiv_login/", "/chipmunk/symbol_redirect/?symbol=VAB"):
+                response = self.client.get(url)
+
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(b"Failed to login", response.content)
+
+    def test_holdings_changes_rejects_negative_bounds(self):
+        for query in ("limit=-1", "limit=0", "after=-1"):
+            response = self.client.get("/chipmunk/holdings_changes/?" + query)
+
+            self.assertEqual(response.status_code, 400, query)
+
+    def test_symbol_redirect_encodes_the_symbol(self):
+        self.redirect_to(return_value={"redirectURI": "https://app.example.com/?token=T"})
+
+        response = self.client.get("/chipmunk/symbol_redirect/", {"symbol": "BRK.B&x=1"})
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response["Location"], "https://app.example.com/?token=T&symbol=BRK.B%26x%3D1")
+
+    def test_symbol_redirect_requires_a_symbol(self):
+        redirect = self.redirect_to()
+
+        self.assertEqual(self.client.get("/chipmunk/symbol_redirect/").status_code, 400)
+        redirect.assert_not_called()
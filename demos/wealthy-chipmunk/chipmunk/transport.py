@@ -0,0 +1,165 @@
+import asyncio
+import os
+import threading
+import weakref
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+_session = None
+_session_lock = threading.Lock()
+
+_host_slots = {}
+
+# httpx clients are bound to the event loop that opened their connections
+_async_clients = weakref.WeakKeyDictionary()
+
+# Event loops serving requests for the life of the process, those of an ASGI server. Under WSGI async_to_sync runs
+# each async view on a loop of its own, a client opened there would be left behind with it
+_long_lived_loops = weakref.WeakSet()
+
+
+def get_session():
+    """Returns the process-wide pooled session shared by every SnapTradeWrapper"""
+    global _session
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+
+    return _session
+
+
+def _build_session():
+    adapter = HTTPAdapter(
+        pool_connections=getattr(settings, "SNAPTRADE_POOL_CONNECTIONS", 10),
+        pool_maxsize=getattr(settings, "SNAPTRADE_POOL_MAXSIZE", 20),
+        pool_block=getattr(settings, "SNAPTRADE_POOL_BLOCK", False),
+    )
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.verify = False
+
+    return session
+
+
+def close_session():
+    """Closes the shared session, the next get_session() call builds a fresh pool"""
+    global _session
+
+    with _session_lock:
+        session, _session = _session, None
+
+    if session is not None:
+        session.close()
+
+
+def host_slot(url):
+    """Returns the process-wide semaphore bounding concurrent fan-out calls to the host of url"""
+    host = urlsplit(url).netloc
+
+    slot = _host_slots.get(host)
+
+    if slot is None:
+        with _session_lock:
+            slot = _host_slots.get(host)
+            if slot is None:
+                slot = _host_slots[host] = threading.BoundedSemaphore(getattr(settings, "SNAPTRADE_FANOUT_PER_HOST", 4))
+
+    return slot
+
+
+@asynccontextmanager
+async def async_host_slot(url):
+    """host_slot for coroutines, the slot is waited for on a thread instead of the event loop"""
+    slot = host_slot(url)
+
+    if not slot.acquire(blocking=False):
+        acquired = asyncio.get_running_loop().run_in_executor(None, slot.acquire)
+        try:
+            await asyncio.shield(acquired)
+        except asyncio.CancelledError:
+            # The thread takes the slot all the same, it goes back as soon as it has
+            acquired.add_done_callback(lambda _: slot.release())
+            raise
+
+    try:
+        yield
+    finally:
+        slot.release()
+
+
+def mark_long_lived_loop():
+    """Lets the running event loop keep a pooled httpx client, chipmunk.asgi calls it for every request"""
+    _long_lived_loops.add(asyncio.get_running_loop())
+
+
+def get_async_client():
+    """Returns the pooled httpx client for the running event loop, None when the loop is not long-lived"""
+    loop = asyncio.get_running_loop()
+
+    if loop not in _long_lived_loops:
+        return None
+
+    client = _async_clients.get(loop)
+
+    if client is None:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=getattr(settings, "SNAPTRADE_POOL_MAXSIZE", 20),
+                max_keepalive_connections=getattr(settings, "SNAPTRADE_POOL_MAXSIZE", 20),
+            ),
+            verify=False,
+        )
+        _async_clients[loop] = client
+
+    return client
+
+
+def transport_stats():
+    """Returns connection reuse counters for every upstream host the shared pool has talked to"""
+    stats = []
+
+    if _session is None:
+        return stats
+
+    adapters = {id(adapter): adapter for adapter in _session.adapters.values()}
+
+    for adapter in adapters.values():
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+
+            stats.append(
+                dict(
+                    host="%s://%s:%s" % (pool.scheme, pool.host, pool.port),
+                    connections=pool.num_connections,
+                    requests=pool.num_requests,
+                    reused=pool.num_requests - pool.num_connections,
+                    idle=sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool is not None else 0,
+                )
+            )
+
+    return stats
+
+
+def _reset_after_fork():
+    # Sockets must not be shared between a pre-forking server and its workers
+    global _session, _session_lock, _host_slots
+
+    _session = None
+    _session_lock = threading.Lock()
+    _host_slots = {}
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
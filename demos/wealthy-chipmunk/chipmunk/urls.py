@@ -4,7 +4,10 @@ from . import views
 
 urlpatterns = [
     path("home/", views.home),
+    path("home/stream/", views.home_stream, name="home_stream"),
     path("passiv_login/", views.passiv_login),
     path("symbol_redirect/", views.symbol_redirect),
+    path("connection_return/", views.connection_return, name="connection_return"),
+    path("holdings_changes/", views.holdings_changes, name="holdings_changes"),
     path("", views.home, name="index"),
 ]
@@ -0,0 +1,119 @@
+"""
+Multi-currency valuation of a Portfolio.
+
+The /currencies/rates pairs are turned into a dense rate matrix once,
+missing pairs filled from their inverse or through one intermediate
+currency, and every position and balance is converted to the base currency
+in one vectorized pass.
+"""
+
+import numpy as np
+
+
+class RateMatrix:
+    def __init__(self, currencies, rates):
+        self.currencies = currencies
+        self.index = {code: index for index, code in enumerate(currencies)}
+        # rates[i, j] converts an amount in currencies[i] to currencies[j], nan when unknown
+        self.rates = rates
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """Builds the matrix from ExchangeRatePairs payloads, an amount in src times exchange_rate is in dst"""
+        known = []
+
+        for pair in pairs:
+            src = (pair.get("src") or {}).get("code")
+            dst = (pair.get("dst") or {}).get("code")
+            rate = pair.get("exchange_rate")
+            if src and dst and rate:
+                known.append((src, dst, rate))
+
+        currencies = sorted({code for src, dst, _ in known for code in (src, dst)})
+        index = {code: position for position, code in enumerate(currencies)}
+
+        rates = np.full((len(currencies), len(currencies)), np.nan)
+        for src, dst, rate in known:
+            rates[index[src], index[dst]] = rate
+        np.fill_diagonal(rates, 1.0)
+
+        # b -> a known, a -> b unknown: use the inverse
+        inverse = np.divide(1.0, rates.T, out=np.full_like(rates, np.nan), where=~np.isnan(rates.T))
+        rates = np.where(np.isnan(rates), inverse, rates)
+
+        # Still unknown: average the a -> b -> c routes through every intermediate currency b
+        missing = np.isnan(rates)
+        if missing.any():
+            routes = rates[:, :, None] * rates[None, :, :]
+            found = ~np.isnan(routes)
+            counts = found.sum(axis=1)
+            sums = np.where(found, routes, 0.0).sum(axis=1)
+            routed = np.divide(sums, counts, out=np.full_like(sums, np.nan), where=counts > 0)
+            rates = np.where(missing, routed, rates)
+
+        return cls(currencies, rates)
+
+    def factors(self, currencies, base):
+        """Multipliers converting amounts in each of currencies to base, nan where no rate is known"""
+        base_index = self.index.get(base)
+        indexes = np.array([self.index.get(code, -1) for code in currencies], dtype=np.intp)
+
+        factors = np.full(len(indexes), np.nan)
+
+        if base_index is not None:
+            known = indexes >= 0
+            factors[known] = self.rates[indexes[known], base_index]
+
+        # Amounts already in base need no rate
+        factors[np.array([code == base for code in currencies], dtype=bool)] = 1.0
+
+        return factors
+
+
+class Valuation:
+    """A Portfolio converted to one base currency"""
+
+    def __init__(self, portfolio, rates, base):
+        factors = rates.factors(portfolio.currencies, base)
+
+        self.base = base
+        self.portfolio = portfolio
+        self.factors = factors
+        # Currencies of the portfolio without a rate to base, their amounts are left out of the totals and
+        # every total shown has to name them
+        self.unconverted = [code for code, factor in zip(portfolio.currencies, factors) if np.isnan(factor)]
+
+        self.position_values = np.nan_to_num(portfolio.market_value() * factors[portfolio.currency])
+        self.cash_values = np.nan_to_num(portfolio.cash * factors[portfolio.cash_currency])
+
+        self.positions_total = float(self.position_values.sum())
+        self.cash_total = float(self.cash_values.sum())
+        self.total = self.positions_total + self.cash_total
+
+    def weights(self):
+        """Share of every position in the converted market value of all positions"""
+        return self.portfolio.weights(self.position_values)
+
+    def account_totals(self):
+        """Converted positions and cash per account, in the order of portfolio.accounts"""
+        return self.portfolio.account_totals(self.position_values, self.cash_values)
+
+    def account_unconverted(self):
+        """Sorted currencies left out of each account total for want of a rate, in the order of portfolio.accounts"""
+        unconverted = [set() for _ in self.portfolio.accounts]
+
+        if not self.unconverted:
+            return [[] for _ in unconverted]
+
+        missing = np.isnan(self.factors)
+        currencies = self.portfolio.currencies
+
+        for currency_indexes, account_indexes in (
+            (self.portfolio.currency, self.portfolio.account),
+            (self.portfolio.cash_currency, self.portfolio.cash_account),
+        ):
+            left_out = missing[currency_indexes]
+            for currency, account in zip(currency_indexes[left_out].tolist(), account_indexes[left_out].tolist()):
+                unconverted[account].add(currencies[currency])
+
+        return [sorted(codes) for codes in unconverted]
@@ -0,0 +1,62 @@
+"""
+Template-ready rows built once in Python.
+
+Templates only loop over these rows and print their values, no dict key
+matching or formatting happens at render time.
+"""
+
+from urllib.parse import quote
+
+from chipmunk.holdings import merge_positions
+from chipmunk.models import Account
+
+SYMBOL_REDIRECT_URL = "http://localhost:8000/chipmunk/symbol_redirect?symbol=%s"
+
+
+def total_label(total, base, unconverted=()):
+    """total in base, naming the unconverted currencies it leaves out rather than counting them as zero"""
+    if not unconverted:
+        return "%.2f %s" % (total, base)
+
+    return "%.2f %s excluding %s (no FX rate)" % (total, base, ", ".join(unconverted))
+
+
+def holdings_view_model(accounts_holdings, valuation=None):
+    """
+    Rows of accounts_holdings.html grouped by account, as
+    [dict(title, total, rows=[dict(symbol, url, currency, units, price)])].
+    total is the account value in the valuation base currency, "" without one.
+    """
+    account_totals = valuation.account_totals().tolist() if valuation is not None else None
+    account_unconverted = valuation.account_unconverted() if valuation is not None else None
+
+    groups = []
+
+    for index, account_holdings in enumerate(accounts_holdings):
+        account = account_holdings.get("account") or {}
+        _, brokerage = Account.key_of(account)
+
+        rows = [
+            dict(
+                symbol=position["symbol"],
+                url=SYMBOL_REDIRECT_URL % quote(position["symbol"]),
+                currency=position["currency"],
+                units=position["units"],
+                price=position["price"],
+            )
+            for position in merge_positions({}, account_holdings.get("positions")).values()
+        ]
+
+        groups.append(
+            dict(
+                title="%s - %s" % (brokerage, account.get("name")),
+                total=(
+                    total_label(account_totals[index], valuation.base, account_unconverted[index])
+                    if account_totals
+                    else ""
+                ),
+                rows=rows,
+            )
+        )
+
+    return groups
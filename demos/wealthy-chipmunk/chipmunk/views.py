@@ -1,72 +1,135 @@
-import urllib
-
-from chipmunk.integrations import SnapTradeWrapper
-from chipmunk.models import Account, UserManager, UserSecret
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from chipmunk.caching import invalidate_holdings
+from chipmunk.decorators import async_login_required
+from chipmunk.integrations import AsyncSnapTradeWrapper, SnapTradeWrapper
+from chipmunk.models import Account, HoldingsChange, HoldingsSnapshot, UserManager
+from chipmunk.resilience import UpstreamUnavailable
+from chipmunk.streaming import BlockingStreamingHttpResponse, HoldingsStream
+from chipmunk.view_models import holdings_view_model
 from django.contrib import messages
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import redirect, render, reverse
+from django.template.loader import get_template
 
 
-@login_required(login_url="/member-auth/login")
-def home(request):
+@async_login_required(login_url="/member-auth/login")
+async def home(request):
     try:
-        stw = SnapTradeWrapper(request.user)
-        holdings = stw.account_holdings()
-        context = dict(holdings=holdings)
-    except:
-        context = {}
+        stw = AsyncSnapTradeWrapper(request.user)
+        holdings = await stw.synced_account_holdings()
+        valuation = await stw.valuation(holdings) if holdings else None
+        context = dict(holdings=holdings, valuation=valuation, groups=holdings_view_model(holdings, valuation))
+
+        # Symbol links and the Connection Portal button redirect without an upstream call
+        if holdings:
+            await stw.prefetch_login_redirect()
+    except UpstreamUnavailable:
+        context = {"error": "Holdings are unavailable right now"}
 
-    return render(request, "home.html", context)
+    # Templates load through the bytecode cache, which is the database under Prod
+    return await sync_to_async(render)(request, "home.jinja", context)
 
 
 @login_required(login_url="/member-auth/login")
-def passiv_login(request):
-    user = request.user
+def home_stream(request):
+    """home sent as it renders: the page shell right away, then every account as soon as its holdings are in"""
+    if not request.user.user_secret:
+        return render(request, "home.jinja", {})
 
-    user_secret = UserSecret.objects.filter(user=user).first()
+    stream = HoldingsStream(SnapTradeWrapper(request.user))
 
-    stw = SnapTradeWrapper(user)
+    return BlockingStreamingHttpResponse(get_template("home_stream.jinja").stream(dict(stream=stream), request))
 
-    if not user_secret:
-        stw.register_user()
-        user_secret = UserSecret.objects.filter(user=user).first()
 
-    if user_secret:
-        redirect_uri_response = stw.login_user_redirect()
+@async_login_required(login_url="/member-auth/login")
+async def passiv_login(request):
+    user = request.user
 
-        if redirect_uri_response:
-            redirect_uri = redirect_uri_response.get("redirectURI")
+    stw = AsyncSnapTradeWrapper(user)
 
-            return redirect(redirect_uri)
+    try:
+        if not user.user_secret:
+            await stw.register_user()
+
+        if user.user_secret:
+            redirect_uri_response = await stw.cached_login_user_redirect()
+
+            if redirect_uri_response:
+                redirect_uri = redirect_uri_response.get("redirectURI")
+
+                return redirect(redirect_uri)
+    except UpstreamUnavailable:
+        pass
 
     context = {"error": "Failed to login"}
-    return render(request, "home.html", context)
+    return await sync_to_async(render)(request, "home.jinja", context)
 
 
-@login_required(login_url="/member-auth/login")
-def symbol_redirect(request):
+@async_login_required(login_url="/member-auth/login")
+async def symbol_redirect(request):
     user = request.user
 
-    query_string = request.environ.get("QUERY_STRING")
-    symbol = urllib.parse.parse_qs(query_string).get("symbol")[0]
+    symbol = request.GET.get("symbol")
 
-    user_secret = UserSecret.objects.filter(user=user).first()
-    stw = SnapTradeWrapper(user)
+    if not symbol:
+        return HttpResponseBadRequest("symbol is required")
 
-    if not user_secret:
-        stw.register_user()
-        user_secret = UserSecret.objects.filter(user=user).first()
+    stw = AsyncSnapTradeWrapper(user)
 
-    if user_secret:
-        redirect_uri_response = stw.login_user_redirect()
+    try:
+        if not user.user_secret:
+            await stw.register_user()
 
-        if redirect_uri_response:
+        if user.user_secret:
+            redirect_uri_response = await stw.cached_login_user_redirect()
 
-            redirect_uri = redirect_uri_response.get("redirectURI")
-            redirect_uri += f"&symbol={symbol}"
-            return redirect(redirect_uri)
+            if redirect_uri_response:
 
-        context = {"error": "Failed to login"}
-    return render(request, "home.html", context)
+                redirect_uri = redirect_uri_response.get("redirectURI")
+                redirect_uri += "&" + urlencode(dict(symbol=symbol))
+                return redirect(redirect_uri)
+    except UpstreamUnavailable:
+        pass
+
+    context = {"error": "Failed to login"}
+    return await sync_to_async(render)(request, "home.jinja", context)
+
+
+@login_required(login_url="/member-auth/login")
+def connection_return(request):
+    """Landing page after the Connection Portal, newly connected accounts must not be hidden by the cache"""
+    invalidate_holdings(request.user)
+    HoldingsSnapshot.expire(request.user)
+
+    return redirect("index")
+
+
+@login_required(login_url="/member-auth/login")
+def holdings_changes(request):
+    """Holdings change feed of the user, pass the returned "next" back as ?after= to get what changed since"""
+    try:
+        after = int(request.GET.get("after", 0))
+        limit = min(int(request.GET.get("limit", 100)), 1000)
+    except ValueError:
+        return JsonResponse({"error": "after and limit must be integers"}, status=400)
+
+    if after < 0 or limit < 1:
+        return JsonResponse({"error": "after must not be negative and limit must be positive"}, status=400)
+
+    feed = HoldingsChange.feed(request.user, after, limit)
+
+    changes = [
+        dict(
+            id=change.id,
+            account=dict(number=change.account.number, brokerage=change.account.brokerage),
+            created_at=change.created_at,
+            changes=change.changes,
+        )
+        for change in feed
+    ]
+
+    return JsonResponse(dict(changes=changes, next=feed[-1].id if feed else after))
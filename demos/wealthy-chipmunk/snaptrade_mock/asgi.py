@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
-
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "snaptrade_mock.settings")
+os.environ.setdefault("DJANGO_CONFIGURATION", "Dev")
+
+# The chipmunk views are async, so this is the entry point to deploy under
+# an ASGI server such as uvicorn or daphne.
+import configurations  # noqa: E402
+
+configurations.setup()
+
+from chipmunk.asgi import ChipmunkASGIHandler  # noqa: E402
 
-application = get_asgi_application()
+application = ChipmunkASGIHandler()
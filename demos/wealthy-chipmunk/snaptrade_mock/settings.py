@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 from pathlib import Path
 
-from configurations import Configuration
+from configurations import Configuration, values
 from my_secrets import secrets
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -48,6 +48,7 @@ class BaseConfig(Configuration):
         "django.middleware.common.CommonMiddleware",
         "django.middleware.csrf.CsrfViewMiddleware",
         "django.contrib.auth.middleware.AuthenticationMiddleware",
+        "chipmunk.middleware.UserSecretMiddleware",
         "django.contrib.messages.middleware.MessageMiddleware",
         "django.middleware.clickjacking.XFrameOptionsMiddleware",
     ]
@@ -55,7 +56,16 @@ class BaseConfig(Configuration):
     ROOT_URLCONF = "snaptrade_mock.urls"
 
     TEMPLATES = [
-        {"BACKEND": "django_jinja.backend.Jinja2", "DIRS": [], "APP_DIRS": True, "OPTIONS": {}},
+        {
+            "BACKEND": "django_jinja.backend.Jinja2",
+            "DIRS": [],
+            "APP_DIRS": True,
+            "OPTIONS": {
+                # Compiled *.jinja templates go to the default cache. With Prod's shared cache a new worker loads
+                # them without compiling, with Dev's per-process LocMemCache each process compiles them once
+                "bytecode_cache": {"name": "default", "enabled": True},
+            },
+        },
         {
             "BACKEND": "django.template.backends.django.DjangoTemplates",
             "DIRS": [],
@@ -126,6 +136,57 @@ class BaseConfig(Configuration):
 
     CRISPY_TEMPLATE_PACK = "bootstrap5"
 
+    # SnapTrade API root, `manage.py runmockapi` serves a local stand-in of it
+    SNAPTRADE_BASE_URL = "https://api.passiv.com/api/v1/"
+
+    # SnapTrade HTTP transport, shared by every SnapTradeWrapper in the process
+    SNAPTRADE_POOL_CONNECTIONS = 10
+    SNAPTRADE_POOL_MAXSIZE = 20
+    SNAPTRADE_POOL_BLOCK = False
+
+    # Per-account fan-out: worker threads per call, and in-flight requests per upstream host
+    SNAPTRADE_FANOUT_MAX_WORKERS = 8
+    SNAPTRADE_FANOUT_PER_HOST = 4
+
+    # Holdings cache: fresh for TTL seconds, then served stale for up to STALE_TTL more while refreshing
+    SNAPTRADE_HOLDINGS_CACHE = "default"
+    SNAPTRADE_HOLDINGS_CACHE_TTL = 60
+    SNAPTRADE_HOLDINGS_CACHE_STALE_TTL = 300
+
+    # Background holdings sync (`manage.py sync_holdings`), views ignore snapshots older than MAX_AGE
+    SNAPTRADE_SYNC_INTERVAL = 300
+    SNAPTRADE_SYNC_JITTER = 60
+    SNAPTRADE_SYNC_WORKERS = 4
+    SNAPTRADE_SYNC_MAX_AGE = 900
+
+    # Upstream rate limits as (requests per second, burst), per partner and per partner endpoint, None disables
+    # one. Interactive calls fail after waiting MAX_WAIT seconds for a token, background ones keep waiting.
+    SNAPTRADE_RATE_LIMIT = (20, 40)
+    SNAPTRADE_ENDPOINT_RATE_LIMIT = (10, 20)
+    SNAPTRADE_RATE_LIMIT_MAX_WAIT = 10
+
+    # Upstream resilience: request timeout, retries of idempotent calls with jittered exponential backoff, a
+    # hedge for slow holdings calls after HEDGE_AFTER seconds (None disables), and a per-operation circuit
+    # breaker opening after THRESHOLD straight failures for RESET_TIMEOUT seconds
+    SNAPTRADE_TIMEOUT = 10
+    SNAPTRADE_RETRY_ATTEMPTS = 3
+    SNAPTRADE_RETRY_BACKOFF = 0.2
+    SNAPTRADE_RETRY_MAX_BACKOFF = 2.0
+    SNAPTRADE_HEDGE_AFTER = None
+    SNAPTRADE_BREAKER_THRESHOLD = 5
+    SNAPTRADE_BREAKER_RESET_TIMEOUT = 30
+
+    # Consolidated holdings totals are in BASE_CURRENCY, FX rates are refetched every FX_RATES_TTL seconds
+    SNAPTRADE_BASE_CURRENCY = "CAD"
+    SNAPTRADE_FX_RATES_TTL = 3600
+
+    # Connection Portal links live 5 minutes and are redeemed once, prefetched ones are dropped after LOGIN_REDIRECT_TTL
+    SNAPTRADE_LOGIN_REDIRECT_TTL = 240
+
+    # User secret tokens are cached for USER_SECRET_CACHE_TTL seconds, and USER_SECRET_LOCAL_TTL in each process
+    SNAPTRADE_USER_SECRET_CACHE_TTL = 300
+    SNAPTRADE_USER_SECRET_LOCAL_TTL = 5
+
 
 class Dev(BaseConfig):
     DEBUG = True
@@ -134,3 +195,87 @@ class Dev(BaseConfig):
     SNAPTRADE_DELTA_PARTNER_ID = secrets.SNAPTRADE_DELTA_PARTNER_ID
     SNAPTRADE_PROD_CONSUMER_KEY = secrets.SNAPTRADE_PROD_SHARED_SECRET
     SNAPTRADE_PROD_PARTNER_ID = secrets.SNAPTRADE_PROD_PARTNER_ID
+
+
+class Prod(BaseConfig):
+    """Settings read from DJANGO_* environment variables, e.g. DJANGO_SECRET_KEY and DJANGO_ALLOWED_HOSTS"""
+
+    DEBUG = False
+
+    SECRET_KEY = values.SecretValue()
+    ALLOWED_HOSTS = values.ListValue([])
+
+    SNAPTRADE_DELTA_CONSUMER_KEY = secrets.SNAPTRADE_DELTA_SHARED_SECRET
+    SNAPTRADE_DELTA_PARTNER_ID = secrets.SNAPTRADE_DELTA_PARTNER_ID
+    SNAPTRADE_PROD_CONSUMER_KEY = secrets.SNAPTRADE_PROD_SHARED_SECRET
+    SNAPTRADE_PROD_PARTNER_ID = secrets.SNAPTRADE_PROD_PARTNER_ID
+
+    # DATABASE_ENGINE is sqlite or postgres, DATABASE_POOLED is for a Postgres reached through a transaction
+    # pooling PgBouncer. Connections are kept for CONN_MAX_AGE seconds instead of one per request. Postgres is an
+    # optional extra left out of requirements.txt, it needs `pip install psycopg2-binary` on top of them
+    DATABASE_ENGINE = values.Value("sqlite")
+    DATABASE_NAME = values.Value(str(BASE_DIR / "db.sqlite3"))
+    DATABASE_HOST = values.Value("")
+    DATABASE_PORT = values.Value("")
+    DATABASE_USER = values.Value("")
+    DATABASE_PASSWORD = values.Value("")
+    DATABASE_POOLED = values.BooleanValue(False)
+    CONN_MAX_AGE = values.IntegerValue(60)
+
+    # Run on every new SQLite connection (chipmunk.db): WAL lets requests read while a holdings refresh writes,
+    # NORMAL sync is durable in WAL mode except on power loss, and reads are served from a memory map
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,
+        "temp_store": "MEMORY",
+    }
+    # Seconds a write waits for the lock held by another writer before "database is locked"
+    SQLITE_TIMEOUT = 20
+
+    # Cached holdings, FX rates, login redirects, refresh claims and user secrets are shared by every worker through
+    # the default cache: the Memcached servers of CACHE_LOCATION (an optional extra, `pip install pymemcache`), or
+    # without them the chipmunk_cache table of the database, created by `manage.py createcachetable`
+    CACHE_LOCATION = values.ListValue([])
+    CACHE_MAX_ENTRIES = values.IntegerValue(100000)
+
+    @classmethod
+    def setup(cls):
+        super().setup()
+
+        if cls.DATABASE_ENGINE == "postgres":
+            database = {
+                "ENGINE": "django.db.backends.postgresql",
+                "NAME": cls.DATABASE_NAME,
+                "HOST": cls.DATABASE_HOST,
+                "PORT": cls.DATABASE_PORT,
+                "USER": cls.DATABASE_USER,
+                "PASSWORD": cls.DATABASE_PASSWORD,
+                "CONN_MAX_AGE": cls.CONN_MAX_AGE,
+                # Server-side cursors do not survive PgBouncer handing the connection to another client
+                "DISABLE_SERVER_SIDE_CURSORS": cls.DATABASE_POOLED,
+            }
+        else:
+            database = {
+                "ENGINE": "django.db.backends.sqlite3",
+                "NAME": cls.DATABASE_NAME,
+                "CONN_MAX_AGE": cls.CONN_MAX_AGE,
+                "OPTIONS": {"timeout": cls.SQLITE_TIMEOUT},
+            }
+
+        cls.DATABASES = {"default": database}
+
+        if cls.CACHE_LOCATION:
+            cache = {
+                "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+                "LOCATION": cls.CACHE_LOCATION,
+            }
+        else:
+            cache = {
+                "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+                "LOCATION": "chipmunk_cache",
+                "OPTIONS": {"MAX_ENTRIES": cls.CACHE_MAX_ENTRIES},
+            }
+
+        cls.CACHES = {"default": cache}
@@ -9,8 +9,9 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/wsgi/
 
 import os
 
-from django.core.wsgi import get_wsgi_application
-
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "snaptrade_mock.settings")
+os.environ.setdefault("DJANGO_CONFIGURATION", "Dev")
+
+from configurations.wsgi import get_wsgi_application  # noqa: E402
 
 application = get_wsgi_application()